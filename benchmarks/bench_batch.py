@@ -0,0 +1,52 @@
+# Times hiding a message in a batch of images: one request per image against one batch request with 1, 2 & 4 workers.
+# The images are read & written in a local directory (LOCAL_STORAGE_DIR), with S3 the fetches of some items also
+# overlap with the processing of others. The speedup is bounded by the cpus available to the process.
+# Usage: python benchmarks/bench_batch.py [number of images] [image size]
+import concurrent.futures
+import json
+import os
+import sys
+import tempfile
+
+storageDir = tempfile.mkdtemp()
+os.environ["LOCAL_STORAGE_DIR"] = storageDir
+
+import cv2
+
+from common import loadHandler, syntheticImage, timeIt
+
+import batch
+hide = loadHandler("hide_text_in_image")
+
+def runSingleRequests(fileNames):
+    for fileName in fileNames:
+        response = hide.lambda_handler({"body": json.dumps({"fileName": fileName, "secretKey": "benchmark", "message": "batch"})}, None)
+        assert response["statusCode"] == 200, response["body"]
+
+def runBatch(fileNames):
+    body = {"secretKey": "benchmark", "message": "batch", "items": [{"fileName": fileName} for fileName in fileNames]}
+    response = hide.batch_lambda_handler({"body": json.dumps(body)}, None)
+    assert json.loads(response["body"])["noOfSucceeded"] == len(fileNames), response["body"]
+
+def main():
+    noOfImages = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    fileNames = [f"image{i}.png" for i in range(noOfImages)]
+    for i, fileName in enumerate(fileNames):
+        cv2.imwrite(os.path.join(storageDir, fileName), syntheticImage(size, size, 3, seed=i))
+    print(f"available cpus: {len(os.sched_getaffinity(0))}, images: {noOfImages}, size: {size}x{size}")
+
+    singleTime, _ = timeIt(runSingleRequests, fileNames, repeat=1)
+    batchTimes = []
+    for noOfWorkers in [1, 2, 4]:
+        batch.maxBatchWorkers = noOfWorkers
+        batch.executor = concurrent.futures.ThreadPoolExecutor(max_workers=noOfWorkers)
+        batchTimes.append((noOfWorkers, timeIt(runBatch, fileNames, repeat=1)[0]))
+
+    print(f"{'mode':<18} {'time s':>9} {'images/s':>9}")
+    print(f"{'single requests':<18} {singleTime:>9.2f} {noOfImages / singleTime:>9.1f}")
+    for noOfWorkers, batchTime in batchTimes:
+        print(f"{f'batch, {noOfWorkers} workers':<18} {batchTime:>9.2f} {noOfImages / batchTime:>9.1f}")
+
+if __name__ == "__main__":
+    main()
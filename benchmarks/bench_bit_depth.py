@@ -0,0 +1,36 @@
+# Time & PSNR of the framed format for every bit depth on a fixed set of images.
+# Usage: python benchmarks/bench_bit_depth.py [payload size in KiB]
+import sys
+
+import numpy as np
+
+from common import loadHandler, syntheticImage, timeIt
+
+hide = loadHandler("hide_text_in_image")
+retrieve = loadHandler("retrieve_text_from_image")
+
+images = {
+    "gray 2 MP": (1200, 1600, 1),
+    "bgr 6 MP": (2000, 3000, 3),
+    "bgra 12 MP": (3000, 4000, 4),
+}
+
+def main():
+    payloadSize = int(sys.argv[1]) * 1024 if len(sys.argv) > 1 else 256 * 1024
+    payload = np.random.default_rng(0).integers(0, 256, payloadSize, dtype=np.uint8).tobytes()
+    print(f"payload {payloadSize // 1024} KiB")
+    print(f"{'image':<12} {'bits':>4} {'samples':>10} {'hide ms':>9} {'retrieve ms':>12} {'psnr':>7}")
+    for name, shape in images.items():
+        srcImage = syntheticImage(*shape)
+        for bitsPerSample in range(1, hide.maxBitsPerSample + 1):
+            hideTime, (stegoImage, stats) = timeIt(lambda: hide.hideFramedDataToImage(payload, hide.binaryPayload, "depth-key", srcImage.copy(), bitsPerSample))
+            if(stegoImage is None):
+                print(f"{name:<12} {bitsPerSample:>4} payload doesn't fit")
+                continue
+            retrieveTime, (errorStatus, data) = timeIt(retrieve.retrieveDataFromImage, "depth-key", stegoImage)
+            assert not errorStatus and data == payload
+            noOfSamples = 8*hide.headerSize - (-8*payloadSize // bitsPerSample)
+            print(f"{name:<12} {bitsPerSample:>4} {noOfSamples:>10} {hideTime*1000:>9.1f} {retrieveTime*1000:>12.1f} {stats['psnr']:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Measures the cold start of every handler, each one in a fresh interpreter: the time to import app.py (the init phase),
+# the time of warmUp & of a first & a second request. The first request of a handler without warm up pays for everything
+# deferred from the import, the difference to the second request is what a warm-up event or WARM_UP_ON_INIT saves.
+# The images are read from a local directory (LOCAL_STORAGE_DIR), so no bucket is needed.
+# Usage: python benchmarks/bench_cold_start.py [--warm-up] [--max-import seconds] [--max-first-request seconds]
+# With the limits it exits with 1 when a handler exceeds one, so that a build can check it.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Nothing heavy (numpy, cv2) is imported at the top, the child process would otherwise have it loaded before app.py:
+repoRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+handlerDirs = ["hide_text_in_image", "retrieve_text_from_image", "embed_watermark", "extract_watermark", "check_document_similarity"]
+
+def getRequestBody(handlerDir):
+    if(handlerDir == "check_document_similarity"):
+        from common import syntheticDocuments
+        srcDoc, candDoc = syntheticDocuments(50, seed=1)
+        return {"srcText": srcDoc, "candText": candDoc}
+    return {
+        "hide_text_in_image": {"fileName": "host.png", "secretKey": "benchmark", "message": "cold start"},
+        "retrieve_text_from_image": {"fileName": "host.png", "secretKey": "benchmark"},
+        "embed_watermark": {"hostImageFileName": "host.jpg", "waterMarkImageFileName": "mark.png", "secretKey": "benchmark"},
+        "extract_watermark": {"embeddedImageFileName": "host.jpg", "secretKey": "benchmark"},
+    }[handlerDir]
+
+def runChild(handlerDir, warmUp):
+    # Runs in the fresh interpreter, prints the timings as one JSON line:
+    sys.path.insert(0, os.path.join(repoRoot, handlerDir))
+    start = time.perf_counter()
+    import app
+    timings = {"import": time.perf_counter() - start, "warmUp": None}
+    if(warmUp):
+        start = time.perf_counter()
+        app.warmUp()
+        timings["warmUp"] = time.perf_counter() - start
+
+    event = {"body": json.dumps(getRequestBody(handlerDir))}
+    for name in ["firstRequest", "secondRequest"]:
+        start = time.perf_counter()
+        response = app.lambda_handler(event, None)
+        timings[name] = time.perf_counter() - start
+        timings["statusCode"] = response["statusCode"]
+    print(json.dumps(timings))
+
+def measure(handlerDir, storageDir, warmUp):
+    env = dict(os.environ, LOCAL_STORAGE_DIR=storageDir)
+    # Every request has to do the work, a result cache hit would hide the first use of the codecs:
+    env.pop("CACHE_HMAC_KEY", None)
+    env.pop("WARM_UP_ON_INIT", None)
+    sharedDir = os.path.join(repoRoot, "shared")
+    env["PYTHONPATH"] = os.pathsep.join([sharedDir] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    command = [sys.executable, os.path.abspath(__file__), "--child", handlerDir] + (["--warm-up"] if warmUp else [])
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{\"import\"")]
+    if(result.returncode != 0 or not lines):
+        raise RuntimeError(f"{handlerDir} failed:\n{result.stderr.strip()}")
+    return json.loads(lines[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child")
+    parser.add_argument("--warm-up", action="store_true", help="call warmUp between the import & the first request")
+    parser.add_argument("--max-import", type=float)
+    parser.add_argument("--max-first-request", type=float)
+    parser.add_argument("handlers", nargs="*", default=handlerDirs)
+    args = parser.parse_args()
+    if(args.child):
+        return runChild(args.child, args.warm_up)
+
+    import cv2
+    from common import syntheticImage, syntheticWaterMark
+
+    exceeded = []
+    with tempfile.TemporaryDirectory() as storageDir:
+        cv2.imwrite(os.path.join(storageDir, "host.png"), syntheticImage(512, 512, 3))
+        cv2.imwrite(os.path.join(storageDir, "host.jpg"), syntheticImage(512, 512, 3))
+        cv2.imwrite(os.path.join(storageDir, "mark.png"), syntheticWaterMark(64))
+
+        print(f"{'handler':<26} {'import s':>9} {'warmUp s':>9} {'1st req s':>10} {'2nd req s':>10} {'status':>7}")
+        for handlerDir in args.handlers:
+            try:
+                timings = measure(handlerDir, storageDir, args.warm_up)
+            except RuntimeError as e:
+                print(e)
+                exceeded.append(handlerDir)
+                continue
+            warmUpTime = f"{timings['warmUp']:>9.3f}" if timings["warmUp"] is not None else f"{'-':>9}"
+            print(f"{handlerDir:<26} {timings['import']:>9.3f} {warmUpTime} {timings['firstRequest']:>10.3f} {timings['secondRequest']:>10.3f} {timings['statusCode']:>7}")
+            if(args.max_import is not None and timings["import"] > args.max_import):
+                exceeded.append(handlerDir)
+            elif(args.max_first_request is not None and timings["firstRequest"] > args.max_first_request):
+                exceeded.append(handlerDir)
+
+    if(exceeded):
+        print("over the limits: " + ", ".join(exceeded))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
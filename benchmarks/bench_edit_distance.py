@@ -0,0 +1,68 @@
+# Micro benchmark of the word level edit distance kernel against the original list of lists dp, on random sentence pairs.
+# Usage: python benchmarks/bench_edit_distance.py
+import time
+
+import numpy as np
+
+from common import loadHandler
+
+similarity = loadHandler("check_document_similarity")
+
+def access(i, j, dp):
+    if(i>=0 and j>=0):
+        return dp[i][j]
+    elif(j >=0):
+        return j+1
+    else:
+        return i+1
+
+def levenshteinSimilarityReference(sentence1, sentence2):
+    # The original implementation:
+    sentence1 = sentence1.split(" ")
+    sentence2 = sentence2.split(" ")
+    dp = [[0]*len(sentence2) for _ in range(len(sentence1))]
+    for i in range(len(sentence1)):
+        for j in range(len(sentence2)):
+            if(sentence1[i]==sentence2[j]):
+                dp[i][j] = access(i-1, j-1, dp)
+            else:
+                dp[i][j] = 1 + min(min(access(i-1, j-1, dp), access(i-1, j, dp)), access(i, j-1, dp))
+    distance = dp[len(sentence1)-1][len(sentence2)-1]/max(len(sentence1), len(sentence2))
+    return 1-distance
+
+def randomPairs(noOfPairs, minWords, maxWords, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(50)]
+    def sentence():
+        return " ".join(rng.choice(vocabulary, rng.integers(minWords, maxWords + 1)))
+    return [(sentence(), sentence()) for _ in range(noOfPairs)] + [("", ""), ("", "term1 term2"), ("term1", "")]
+
+def main():
+    print(f"{'words':>9} {'reference us':>13} {'kernel us':>10} {'cutoff us':>10}")
+    for minWords, maxWords in [(1, 10), (10, 30), (30, 60), (60, 120)]:
+        pairs = randomPairs(2000, minWords, maxWords)
+        vocabulary = {}
+        encoded = [similarity.encodeSentences(pair, vocabulary) for pair in pairs]
+        masks = [(similarity.getPatternMasks(words1), len(words1), words2) for words1, words2 in encoded]
+
+        start = time.perf_counter()
+        reference = [levenshteinSimilarityReference(*pair) for pair in pairs]
+        referenceTime = time.perf_counter() - start
+
+        start = time.perf_counter()
+        kernel = [similarity.getSimilarity(*mask) for mask in masks]
+        kernelTime = time.perf_counter() - start
+        assert kernel == reference, "kernel differs from the original dp"
+        assert [similarity.levenshtein_similarity(*pair) for pair in pairs] == reference
+
+        # With a cutoff at 0.5 most random pairs stop early:
+        start = time.perf_counter()
+        cutoff = [similarity.getSimilarity(*mask, 0.5) for mask in masks]
+        cutoffTime = time.perf_counter() - start
+        assert all(value == (expected if expected > 0.5 else None) for value, expected in zip(cutoff, reference))
+
+        perPair = 1e6 / len(pairs)
+        print(f"{minWords:>4}-{maxWords:<4} {referenceTime*perPair:>13.1f} {kernelTime*perPair:>10.1f} {cutoffTime*perPair:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Encode time against output bytes of every encoder the handlers can pick, for representative images:
+# lossless encoders on images with a message in their least significant bits (checked to decode to the same samples),
+# lossy encoders on watermarked images with the bit error rate of the watermark extracted from the decoded output.
+# Usage: python benchmarks/bench_encoders.py [height] [width]
+import sys
+
+import cv2
+import numpy as np
+
+from common import loadHandler, syntheticImage, syntheticWaterMark, timeIt
+
+import encoders
+
+embed = loadHandler("embed_watermark")
+extract = loadHandler("extract_watermark")
+
+losslessEncodings = [
+    ("latency (png default)", {}),
+    ("size (webp lossless)", {"encoding": "size"}),
+    ("png level 1", {"compressionLevel": 1}),
+    ("png level 6", {"compressionLevel": 6}),
+    ("png level 9", {"compressionLevel": 9}),
+]
+lossyEncodings = [
+    ("latency (jpg q95)", {}),
+    ("size (jpg q85)", {"encoding": "size"}),
+    ("jpg q75", {"quality": 75}),
+    ("webp q90", {"outputFormat": "webp"}),
+    ("webp q80", {"outputFormat": "webp", "quality": 80}),
+]
+
+def getImages(height, width):
+    # A photo like image with sensor noise, a smooth graphic & a grayscale scan:
+    photo = syntheticImage(height, width, 3)
+    graphic = cv2.GaussianBlur(syntheticImage(height, width, 3, seed=1), (0, 0), 3)
+    scan = syntheticImage(height, width, 1, seed=2)
+    return [("photo", photo), ("graphic", graphic), ("grayscale scan", scan)]
+
+def hideRandomBits(image):
+    # Every least significant bit replaced, like an image filled up with a message:
+    rng = np.random.default_rng(0)
+    return image ^ ((image ^ rng.integers(0, 256, image.shape, dtype=np.uint8)) & 1)
+
+def printRow(name, encoder, seconds, noOfBytes, extra=""):
+    print(f"  {name:<24} {encoder['extension']:<6} {seconds*1000:>9.1f} {noOfBytes/1e6:>9.2f} {extra}")
+
+def main():
+    height = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    waterMark = syntheticWaterMark(128)
+    referenceWaterMark = embed.binariseImageData(waterMark)
+
+    for imageName, image in getImages(height, width):
+        print(f"\n{imageName} {image.shape}, stego output (lossless):")
+        print(f"  {'encoder':<24} {'format':<6} {'encode ms':>9} {'MB':>9}")
+        stegoImage = hideRandomBits(image)
+        for name, fields in losslessEncodings:
+            encoding, errorMessage = encoders.getEncoding(fields, lossless=True)
+            encoder = encoders.getEncoder(encoding, stegoImage)
+            seconds, data = timeIt(encoders.encode, stegoImage, encoder, repeat=2)
+            assert np.array_equal(cv2.imdecode(data, cv2.IMREAD_UNCHANGED), stegoImage), name
+            printRow(name, encoder, seconds, len(data))
+
+        print(f"{imageName} {image.shape}, watermark output (lossy):")
+        print(f"  {'encoder':<24} {'format':<6} {'encode ms':>9} {'MB':>9} {'bit errors':>10}")
+        waterMarkedImage = embed.embedWaterMarkInHostImage(image, waterMark, "benchmark-key")
+        for name, fields in lossyEncodings:
+            encoding, errorMessage = encoders.getEncoding(fields, lossless=False)
+            encoder = encoders.getEncoder(encoding, waterMarkedImage)
+            seconds, data = timeIt(encoders.encode, waterMarkedImage, encoder, repeat=2)
+            extracted = extract.extractWaterMarkImage(cv2.imdecode(data, cv2.IMREAD_UNCHANGED), "benchmark-key")
+            bitErrorRate = np.count_nonzero(extracted != referenceWaterMark) / extracted.size
+            printRow(name, encoder, seconds, len(data), f"{bitErrorRate:>10.4f}")
+
+if __name__ == "__main__":
+    main()
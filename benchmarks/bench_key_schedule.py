@@ -0,0 +1,127 @@
+# Checks the shared key schedule against the getPermutedArray & getPermutedIndices the handlers used to have, on random
+# keys, sizes & image shapes, then times the schedule of a large image uncached & cached and the gather of a chunk.
+# Usage: python benchmarks/bench_key_schedule.py [number of random cases]
+import random
+import sys
+
+import numpy as np
+
+from common import timeIt
+
+import keyschedule
+
+def getPermutedArrayReference(secretKey, n):
+    # The function copied into the four handlers before:
+    S = [i for i in range(n)]
+    T = [0 for i in range(n)]
+    for i in range(n):
+        T[i] += ord(secretKey[i%len(secretKey)])
+        T[i] %= n
+    j = 0
+    for i in range(n):
+        j = (j + S[i] + T[i])%n
+        # swapping S[i] & S[j]
+        temp = S[i]
+        S[i] = S[j]
+        S[j] = temp
+    return S
+
+def getPermutedIndicesReference(secretKey, shape, start, stop):
+    permutedArrays = [np.array(getPermutedArrayReference(secretKey, dim)) for dim in shape]
+    position = np.arange(start, stop)
+    indices = []
+    stride = int(np.prod(shape))
+    for permutedArray, dim in zip(permutedArrays, shape):
+        stride //= dim
+        indices.append(permutedArray[(position // stride) % dim])
+    return tuple(indices)
+
+def randomKey(rng):
+    # Printable ascii, latin-1 & code points far above the sizes, which wrap around with % n:
+    alphabets = [
+        [chr(c) for c in range(32, 127)],
+        [chr(c) for c in range(32, 256)],
+        [chr(c) for c in range(32, 127)] + ["é", "中", "\U0001F511", "\ud800"]
+    ]
+    alphabet = rng.choice(alphabets)
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 64)))
+
+def checkPermutations(rng, noOfCases):
+    sizes = [1, 2, 3, 7, 128, 255, 256, 257] + [rng.randint(1, 5000) for _ in range(noOfCases)]
+    for n in sizes:
+        secretKey = randomKey(rng)
+        expected = getPermutedArrayReference(secretKey, n)
+        assert keyschedule.computePermutedArray(secretKey, n) == expected, (secretKey, n)
+        assert keyschedule.getPermutedArray(secretKey, n) == expected, (secretKey, n)
+        # Second call from the cache:
+        assert keyschedule.getPermutedArray(secretKey, n) == expected, (secretKey, n)
+    print(f"permutations: {len(sizes)} random keys & sizes match")
+
+def checkFlatIndices(rng, noOfCases):
+    for _ in range(noOfCases):
+        height, width = rng.randint(1, 300), rng.randint(1, 300)
+        shape = rng.choice([(height, width), (height, width, 3), (height, width, 4)])
+        secretKey = randomKey(rng)
+        size = int(np.prod(shape))
+        start = rng.randint(0, size - 1)
+        stop = rng.randint(start + 1, size)
+        expected = np.ravel_multi_index(getPermutedIndicesReference(secretKey, shape, start, stop), shape)
+        flatIndices = keyschedule.getFlatIndices(keyschedule.getImageSchedule(secretKey, shape), start, stop)
+        assert np.array_equal(flatIndices, expected), (secretKey, shape, start, stop)
+        # Every sample of the image is visited exactly once:
+        if(size <= 20000):
+            allIndices = keyschedule.getFlatIndices(keyschedule.getImageSchedule(secretKey, shape), 0, size)
+            assert np.array_equal(np.sort(allIndices), np.arange(size)), (secretKey, shape)
+    print(f"flat indices: {noOfCases} random shapes & ranges match")
+
+def checkEviction():
+    cacheSize = keyschedule.cacheSize
+    keyschedule.cacheSize = 4
+    try:
+        for i in range(10):
+            keyschedule.getPermutation(f"key{i}", 64)
+        assert len(keyschedule.cache) <= 4
+        assert keyschedule.getPermutedArray("key0", 64) == getPermutedArrayReference("key0", 64)
+    finally:
+        keyschedule.cacheSize = cacheSize
+    print("eviction: bounded & recomputed after eviction")
+
+def main():
+    noOfCases = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(0)
+    checkPermutations(rng, noOfCases)
+    checkFlatIndices(rng, noOfCases)
+    checkEviction()
+
+    shape = (4000, 6000, 3)
+    secretKey = "benchmark-key"
+    referenceTime, _ = timeIt(lambda: [np.array(getPermutedArrayReference(secretKey, dim)) for dim in shape])
+    keyschedule.cache.clear()
+    firstTime, _ = timeIt(keyschedule.getImageSchedule, secretKey, shape, repeat=1)
+    cachedTime, schedule = timeIt(keyschedule.getImageSchedule, secretKey, shape)
+    print(f"\nschedule of a {shape} image:")
+    print(f"{'reference':<24} {referenceTime*1000:>9.2f} ms")
+    print(f"{'shared, first request':<24} {firstTime*1000:>9.2f} ms")
+    print(f"{'shared, cached':<24} {cachedTime*1000:>9.3f} ms")
+
+    image = np.zeros(shape, dtype=np.uint8)
+    start, stop = 1 << 22, (1 << 22) + (1 << 20)
+    permutedArrays = [np.array(getPermutedArrayReference(secretKey, dim)) for dim in shape]
+    def gatherReference():
+        position = np.arange(start, stop)
+        indices = []
+        stride = int(np.prod(shape))
+        for permutedArray, dim in zip(permutedArrays, shape):
+            stride //= dim
+            indices.append(permutedArray[(position // stride) % dim])
+        return image[tuple(indices)]
+    def gatherFlat():
+        return image.reshape(-1)[keyschedule.getFlatIndices(schedule, start, stop)]
+    referenceTime, _ = timeIt(gatherReference)
+    flatTime, _ = timeIt(gatherFlat)
+    print(f"\ngather of {stop - start} samples:")
+    print(f"{'(row, col, channel)':<24} {referenceTime*1000:>9.2f} ms")
+    print(f"{'flat indices':<24} {flatTime*1000:>9.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# Times computeSimilarity with the candidate sentences sharded over 1, 2, 4 & 6 worker processes & checks that every
+# worker count returns the same result as the serial path. The speedup is bounded by the cpus available to the process.
+# Usage: python benchmarks/bench_parallel.py [number of sentences] [pruning]
+import os
+import sys
+
+from common import loadHandler, syntheticDocuments, timeIt
+
+similarity = loadHandler("check_document_similarity")
+
+def main():
+    noOfSentences = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    pruning = sys.argv[2] if len(sys.argv) > 2 else "exact"
+    srcDoc, candDoc = syntheticDocuments(noOfSentences, seed=noOfSentences)
+    print(f"available cpus: {len(os.sched_getaffinity(0))}, sentences: {noOfSentences}, pruning: {pruning}")
+
+    # Warm the document cache, so that only the sentence comparison is timed:
+    similarity.computeSimilarity(srcDoc, candDoc, pruning, noOfWorkers=1)
+    print(f"{'workers':>7} {'time s':>9} {'speedup':>8}")
+    serialTime, serial = timeIt(similarity.computeSimilarity, srcDoc, candDoc, pruning, similarity.defaultRecall, 1, repeat=1)
+    print(f"{1:>7} {serialTime:>9.2f} {1.0:>8.2f}")
+    for noOfWorkers in [2, 4, 6]:
+        parallelTime, parallel = timeIt(similarity.computeSimilarity, srcDoc, candDoc, pruning, similarity.defaultRecall, noOfWorkers, repeat=1)
+        assert parallel == serial, "sharding changed the result"
+        print(f"{noOfWorkers:>7} {parallelTime:>9.2f} {serialTime / parallelTime:>8.2f}")
+
+if __name__ == "__main__":
+    main()
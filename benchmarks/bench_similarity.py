@@ -0,0 +1,29 @@
+# Times computeSimilarity on synthetic documents of increasing length for every pruning mode, checks that the exact
+# pruning returns the same result as comparing all the pairs & reports the recall of the approximate mode.
+# Usage: python benchmarks/bench_similarity.py [max number of sentences for the all pairs run]
+import sys
+
+from common import loadHandler, syntheticDocuments, timeIt
+
+similarity = loadHandler("check_document_similarity")
+
+def main():
+    maxAllPairs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f"{'sentences':>9} {'none s':>9} {'exact s':>9} {'approx s':>9} {'matches':>8} {'approx recall':>14}")
+    for noOfSentences in [100, 250, 500, 1000, 2000]:
+        srcDoc, candDoc = syntheticDocuments(noOfSentences, seed=noOfSentences)
+        exactTime, exact = timeIt(similarity.computeSimilarity, srcDoc, candDoc, "exact", repeat=1)
+        approximateTime, approximate = timeIt(similarity.computeSimilarity, srcDoc, candDoc, "approximate", repeat=1)
+
+        noneTime = float("nan")
+        if(noOfSentences <= maxAllPairs):
+            noneTime, allPairs = timeIt(similarity.computeSimilarity, srcDoc, candDoc, "none", repeat=1)
+            assert allPairs == exact, "exact pruning changed the result"
+
+        exactMatches = {(m["candidateDocument"], m["sourceDocument"]) for m in exact[1]}
+        approximateMatches = {(m["candidateDocument"], m["sourceDocument"]) for m in approximate[1]}
+        recall = len(exactMatches & approximateMatches) / max(1, len(exactMatches))
+        print(f"{noOfSentences:>9} {noneTime:>9.2f} {exactTime:>9.2f} {approximateTime:>9.2f} {len(exactMatches):>8} {recall:>14.3f}")
+
+if __name__ == "__main__":
+    main()
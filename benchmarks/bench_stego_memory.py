@@ -0,0 +1,40 @@
+# Checks that hiding data works in place: the peak memory of decode + hide + encode should stay around
+# one decoded image buffer plus the encoded output. Also checks the sparse PSNR against cv2.PSNR.
+# Usage: python benchmarks/bench_stego_memory.py
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from common import loadHandler, syntheticImage
+
+hide = loadHandler("hide_text_in_image")
+
+def main():
+    message = "forensic evidence manifest " * 75
+    for height, width, channels in [(1000, 1500, 1), (2000, 3000, 3), (3000, 4000, 4)]:
+        imageFile = cv2.imencode(".png", syntheticImage(height, width, channels))[1].tobytes()
+
+        original = cv2.imdecode(np.frombuffer(imageFile, np.uint8), cv2.IMREAD_UNCHANGED)
+
+        # Same steps as the handler, starting from the downloaded bytes:
+        tracemalloc.start()
+        srcImage = cv2.imdecode(np.frombuffer(imageFile, np.uint8), cv2.IMREAD_UNCHANGED)
+        responseImage, stats = hide.hideDataToImage(message, "memory-key", srcImage)
+        encoded = cv2.imencode(".png", responseImage)[1]
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert responseImage is srcImage, "the image should be modified in place"
+        expectedPSNR = cv2.PSNR(responseImage, original)
+        assert abs(stats["psnr"] - expectedPSNR) < 1e-9, (stats["psnr"], expectedPSNR)
+        assert stats["noOfFlippedBits"] == np.count_nonzero(responseImage != original)
+
+        budget = srcImage.nbytes + encoded.nbytes
+        extra = peak - budget
+        print(f"{height}x{width}x{channels}: image {srcImage.nbytes/2**20:7.2f} MiB, encoded {encoded.nbytes/2**20:7.2f} MiB, "
+              f"peak {peak/2**20:7.2f} MiB (extra {extra/2**20:6.2f} MiB), psnr {stats['psnr']:.2f}")
+        assert extra < 0.05 * budget + 4*2**20, "peak memory is well above one image buffer plus the encoded output"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Checks embedWaterMarkInHostImage & extractWaterMarkImage of the handlers against verbatim copies of the original
+# per-block scipy implementation (with its own permutation) & times both.
+# The original truncated every block to np.uint8, the handlers round & clip the Y plane once. So the handlers are checked
+# bit for bit against the original loop with the Y plane kept in float & rounded at the end, and only approximately
+# against the original itself (which also wraps around the pixels of blocks that go below 0 or above 255).
+# The extracted watermarks are compared both ways, including across the two embeddings.
+# Usage: python benchmarks/bench_watermark.py
+import cv2
+import numpy as np
+from scipy.fftpack import dct, idct
+
+from common import loadHandler, syntheticImage, syntheticWaterMark, timeIt
+
+embed = loadHandler("embed_watermark")
+extract = loadHandler("extract_watermark")
+
+H, W, N, fact = embed.H, embed.W, embed.N, embed.fact
+
+# This idea is motivated by RC4 algorithm to generate randomised permuted array from secret key
+def getPermutedArray(secretKey, n):
+    S = [i for i in range(n)]
+    T = [0 for i in range(n)]
+    for i in range(n):
+        T[i] += ord(secretKey[i%len(secretKey)])
+        T[i] %= n
+    j = 0
+    for i in range(n):
+        j = (j + S[i] + T[i])%n
+        # swapping S[i] & S[j]
+        temp = S[i]
+        S[i] = S[j]
+        S[j] = temp
+    return S
+
+def embedOriginal(hostImage, waterMarkImage, secretKey, roundOnce=False):
+    # The original embedWaterMarkInHostImage. roundOnce keeps the Y plane in float & rounds & clips it at the end,
+    # which is what the handler is meant to compute:
+
+    if len(hostImage.shape) == 2:
+        hostImage = cv2.cvtColor(hostImage, cv2.COLOR_GRAY2BGR)
+    if len(waterMarkImage.shape) == 2:
+        waterMarkImage = cv2.cvtColor(waterMarkImage, cv2.COLOR_GRAY2BGR)
+
+    # Convert to YUV format from BGR format (we will store information in Y channel denoting luminance):
+    hostOriginalDim = (hostImage.shape[1], hostImage.shape[0])
+    hostImage = cv2.resize(hostImage, (H, H), interpolation=cv2.INTER_CUBIC)
+    hostImageY, hostImageU, hostImageV = cv2.split(cv2.cvtColor(hostImage, cv2.COLOR_BGR2YUV))
+    if(roundOnce):
+        hostImageY = hostImageY.astype(np.float64)
+
+    # Get the data to embed in binary format:
+    waterMarkImageBinary = embed.binariseImageData(waterMarkImage)
+    waterMarkImageBinary = waterMarkImageBinary.reshape(-1) # Converts to 1D array
+
+
+    lengthofBinaryString = W*W
+    # Do the watermarking:
+    numBlocksIn1Dim = H // N
+    permutedArray = getPermutedArray(secretKey, numBlocksIn1Dim)
+    index = 0
+    shouldBreak = False
+
+    for i in permutedArray:
+        for j in permutedArray:
+            BLOCK = hostImageY[8*i:8*i+N, 8*j:8*j+N]
+            BLOCK = dct(dct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho')
+            data = BLOCK[2][2]
+            if(waterMarkImageBinary[index]==0):
+                data += fact
+            else:
+                data -= fact
+            BLOCK[2][2] = data
+            BLOCK = idct(idct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho')
+            hostImageY[8*i:8*i+N, 8*j:8*j+N] = BLOCK
+            index += 1
+            if(index==lengthofBinaryString):
+                shouldBreak = True
+                break
+        if(shouldBreak):
+            break
+
+    if(roundOnce):
+        hostImageY = np.clip(np.rint(hostImageY), 0, 255).astype(np.uint8)
+
+    # Combine to get watermarkEmbedded image
+    hostImage = cv2.merge((hostImageY, hostImageU, hostImageV))
+    hostImage = cv2.cvtColor(hostImage, cv2.COLOR_YUV2BGR)
+    hostImage = cv2.resize(hostImage, hostOriginalDim, interpolation=cv2.INTER_CUBIC)
+
+    return hostImage
+
+def extractOriginal(imageEmbeddedWithWaterMark, secretKey):
+    # The original extractWaterMarkImage:
+
+    # Get the data:
+    if len(imageEmbeddedWithWaterMark.shape) == 2:
+        imageEmbeddedWithWaterMark = cv2.cvtColor(imageEmbeddedWithWaterMark, cv2.COLOR_GRAY2BGR)
+    imageEmbeddedWithWaterMark = cv2.resize(imageEmbeddedWithWaterMark, (H, H), interpolation=cv2.INTER_CUBIC)
+    imageEmbeddedWithWaterMarkY, _, _ = cv2.split(cv2.cvtColor(imageEmbeddedWithWaterMark, cv2.COLOR_BGR2YUV))
+
+    waterMarkImageBinary = ""
+    index = 0
+    shouldBreak = False
+    lengthofBinaryString = W*W
+    numBlocksIn1Dim = H // N
+    permutedArray = getPermutedArray(secretKey, numBlocksIn1Dim)
+
+    # Extract the data:
+    for i in permutedArray:
+        for j in permutedArray:
+            BLOCK = imageEmbeddedWithWaterMarkY[8*i:8*i+N, 8*j:8*j+N]
+            # Take DCT:
+            BLOCK = dct(dct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho')
+            data = BLOCK[2][2]
+            if(data >= 0):
+                waterMarkImageBinary += '0'
+            else:
+                waterMarkImageBinary += '1'
+            index += 1
+            if(index==lengthofBinaryString):
+                shouldBreak = True
+                break
+        if(shouldBreak):
+            break
+
+   #Save the extracted watermark back:
+    waterMarkImageExtracted = [int(waterMarkImageBinary[i])*255 for i in range(0, len(waterMarkImageBinary))]
+    waterMarkImageExtracted = np.uint8(waterMarkImageExtracted).reshape((W, W))
+
+    return waterMarkImageExtracted
+
+def getMaxDifference(image1, image2):
+    return int(np.abs(image1.astype(np.int16) - image2.astype(np.int16)).max())
+
+def getFarOffPixels(image1, image2, levels):
+    difference = np.abs(image1.astype(np.int16) - image2.astype(np.int16)).reshape(image1.shape[0], image1.shape[1], -1)
+    return np.count_nonzero(difference.max(axis=2) > levels)
+
+def checkCase(name, host, waterMark, secretKey):
+    reference = embed.binariseImageData(waterMark if waterMark.ndim == 3 else cv2.cvtColor(waterMark, cv2.COLOR_GRAY2BGR))
+    embedded = embed.embedWaterMarkInHostImage(host, waterMark, secretKey)
+    roundedOnce = embedOriginal(host, waterMark, secretKey, roundOnce=True)
+    original = embedOriginal(host, waterMark, secretKey)
+
+    # Pixels of the Y plane exactly on .5 may round either way after the float error of the dct round trip:
+    assert embedded.shape == roundedOnce.shape and embedded.dtype == roundedOnce.dtype, name
+    differingPixels = np.count_nonzero(np.any((embedded != roundedOnce).reshape(embedded.shape[0], embedded.shape[1], -1), axis=2))
+    assert differingPixels <= 10 and getMaxDifference(embedded, roundedOnce) <= 1, f"{name}: embedding differs from the original loop rounded once in {differingPixels} pixels"
+    # Truncating instead of rounding moves the Y plane by at most one level, a few levels of BGR after the resize. Only
+    # the pixels around those the original wrapped around are further off (more of them when a small host is upscaled):
+    farOffPixels = getFarOffPixels(embedded, original, 4)
+    assert farOffPixels <= 0.01 * host.shape[0] * host.shape[1], f"{name}: {farOffPixels} pixels are more than 4 levels off the original"
+
+    # Coefficients that are mathematically 0 may come out as +/-1e-16 in either path, so only a handful of bits may differ:
+    for embeddedName, image in [("handler", embedded), ("original", original)]:
+        extracted = extract.extractWaterMarkImage(image, secretKey)
+        extractedOriginal = extractOriginal(image, secretKey)
+        mismatches = np.count_nonzero(extracted != extractedOriginal)
+        assert mismatches <= 10, f"{name}: extraction of the {embeddedName} embedding differs from the original in {mismatches} bits"
+        bitErrorRate = np.count_nonzero(extracted != reference) / extracted.size
+        print(f"{name:<22} {embeddedName:<9} embedding: {differingPixels} pixels off the rounded original, {farOffPixels} "
+              f"pixels > 4 levels off the original, {mismatches} differing bits, bit error rate {bitErrorRate:.4f}")
+
+def main():
+    secretKey = "benchmark-key"
+    waterMark = syntheticWaterMark(256)
+    checkCase("bgr 1200x1600", syntheticImage(1200, 1600, 3), waterMark, secretKey)
+    checkCase("gray 900x700", syntheticImage(900, 700, 1), waterMark, "another key")
+    checkCase("bgr 1024x1024, gray wm", syntheticImage(1024, 1024, 3, seed=1), cv2.cvtColor(waterMark, cv2.COLOR_BGR2GRAY), "k")
+
+    host = syntheticImage(1200, 1600, 3)
+    originalTime, _ = timeIt(embedOriginal, host, waterMark, secretKey, repeat=1)
+    handlerTime, embedded = timeIt(embed.embedWaterMarkInHostImage, host, waterMark, secretKey)
+    print(f"\nembedding per block : {originalTime*1000:9.2f} ms")
+    print(f"embedding handler   : {handlerTime*1000:9.2f} ms  ({originalTime/handlerTime:.0f}x)")
+    originalTime, _ = timeIt(extractOriginal, embedded, secretKey, repeat=1)
+    handlerTime, _ = timeIt(extract.extractWaterMarkImage, embedded, secretKey)
+    print(f"extraction per block: {originalTime*1000:9.2f} ms")
+    print(f"extraction handler  : {handlerTime*1000:9.2f} ms  ({originalTime/handlerTime:.0f}x)")
+
+    host = syntheticImage(3000, 4000, 3)
+    fullTime, watermarked = timeIt(embed.embedWaterMarkInHostImage, host, waterMark, secretKey)
+    print(f"embedWaterMarkInHostImage 12 MP: {fullTime*1000:9.2f} ms")
+    fullTime, _ = timeIt(extract.extractWaterMarkImage, watermarked, secretKey)
+    print(f"extractWaterMarkImage 12 MP    : {fullTime*1000:9.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Compares the resized (HxH round trip) & native watermark modes: embed & extract latency, pixels changed & bit error
+# rate of the extracted watermark, straight from the embedded image & after saving it as jpg.
+# Usage: python benchmarks/bench_watermark_modes.py
+import cv2
+import numpy as np
+
+from common import loadHandler, syntheticImage, syntheticWaterMark, timeIt
+
+embed = loadHandler("embed_watermark")
+extract = loadHandler("extract_watermark")
+
+sizes = [(1200, 1600), (3000, 4000), (4000, 6000)]
+qualities = [None, 95, 85]
+
+def getBitErrorRate(extracted, reference):
+    if(extracted is None):
+        return float("nan")
+    return np.count_nonzero(extracted != reference) / extracted.size
+
+def main():
+    secretKey = "benchmark-key"
+    waterMark = syntheticWaterMark(128)
+    reference = extract.binariseImageData(waterMark)
+    embedders = {"resized": embed.embedWaterMarkInHostImage, "native": embed.embedWaterMarkNative}
+    extractors = {"resized": extract.extractWaterMarkImage, "native": extract.extractWaterMarkNative}
+
+    header = " ".join(f"{'ber ' + (f'q{quality}' if quality else 'raw'):>9}" for quality in qualities)
+    print(f"{'size':<11} {'mode':<8} {'embed ms':>9} {'extract ms':>10} {'changed px':>11} {header}")
+    for height, width in sizes:
+        host = syntheticImage(height, width, 3)
+        for mode in ["resized", "native"]:
+            # The native mode writes into the host, every run gets a copy:
+            embedTime, embedded = timeIt(lambda: embedders[mode](host.copy(), waterMark, secretKey))
+            extractTime, _ = timeIt(extractors[mode], embedded, secretKey)
+            changedPixels = np.count_nonzero(np.any(embedded != host, axis=2))
+            bitErrorRates = []
+            for quality in qualities:
+                image = embedded
+                if(quality is not None):
+                    image = cv2.imdecode(cv2.imencode('.jpg', embedded, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_UNCHANGED)
+                bitErrorRates.append(getBitErrorRate(extractors[mode](image, secretKey), reference))
+            rates = " ".join(f"{rate:>9.4f}" for rate in bitErrorRates)
+            print(f"{f'{height}x{width}':<11} {mode:<8} {embedTime*1000:>9.1f} {extractTime*1000:>10.1f} {changedPixels:>11} {rates}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+
+repoRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The images copy the shared modules next to app.py, make them importable the same way:
+sys.path.insert(0, os.path.join(repoRoot, "shared"))
+
+def loadHandler(handlerDir):
+    # Every handler is called app.py, so load each one under its own module name:
+    path = os.path.join(repoRoot, handlerDir, "app.py")
+    spec = importlib.util.spec_from_file_location(handlerDir + "_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def timeIt(function, *args, repeat=3):
+    # Best of `repeat` runs, the result of the last run is returned along with the time:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def syntheticImage(height, width, channels, seed=0):
+    # Smooth gradients with some noise, closer to a photo than uniform noise. Built a band of rows at a time (the noise
+    # comes out of the generator in the same order), so that 24 MP images don't need gigabytes of float64 temporaries:
+    rng = np.random.default_rng(seed)
+    x = np.arange(width)
+    image = np.empty((height, width) if channels == 1 else (height, width, channels), dtype=np.uint8)
+    bandSize = max(1, (1 << 20) // (width * channels))
+    for top in range(0, height, bandSize):
+        y = np.arange(top, min(top + bandSize, height)).reshape(-1, 1)
+        base = 127 + 60*np.sin(x / 37.0) + 60*np.cos(y / 53.0)
+        if(channels == 1):
+            band = base + rng.normal(0, 8, base.shape)
+        else:
+            band = base[..., None] + rng.normal(0, 8, base.shape + (channels,))
+        image[top:top + len(y)] = np.clip(band, 0, 255)
+    return image
+
+def syntheticWaterMark(size, seed=0):
+    rng = np.random.default_rng(seed)
+    waterMark = np.zeros((size, size, 3), dtype=np.uint8)
+    waterMark[size//4:3*size//4, size//4:3*size//4] = 255
+    waterMark[rng.random((size, size)) < 0.1] ^= 255
+    return waterMark
+
+def syntheticDocuments(noOfSentences, seed=0, copiedFraction=0.3, vocabularySize=2000):
+    # A source document & a candidate document where copiedFraction of the candidate sentences are edited copies of source sentences:
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(vocabularySize)]
+    # Zipf like word frequencies, as in natural text:
+    weights = 1.0 / np.arange(1, vocabularySize + 1)
+    weights /= weights.sum()
+
+    def sentence():
+        return list(rng.choice(vocabulary, rng.integers(4, 25), p=weights))
+
+    srcSentences = [sentence() for _ in range(noOfSentences)]
+    candSentences = []
+    for _ in range(noOfSentences):
+        if(rng.random() < copiedFraction):
+            words = list(srcSentences[rng.integers(noOfSentences)])
+            for k in range(len(words)):
+                if(rng.random() < 0.2):
+                    words[k] = vocabulary[rng.integers(vocabularySize)]
+            candSentences.append(words)
+        else:
+            candSentences.append(sentence())
+
+    def document(sentences):
+        return " ".join(" ".join(words).capitalize() + "." for words in sentences)
+
+    return document(srcSentences), document(candSentences)
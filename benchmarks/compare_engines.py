@@ -0,0 +1,94 @@
+# Compares the tfidf engine with the levenshtein engine on a labelled sample set: every candidate sentence is either
+# unrelated to the source, an edited copy of a known source sentence, with the kind of edit as its label, or a sentence of
+# only stop words & punctuation, which cleans down to nothing (both documents have some of those).
+# Reports the precision & recall of the reported matches for every kind of edit & the time of both engines.
+# Usage: python benchmarks/compare_engines.py [number of sentences]
+import sys
+
+import numpy as np
+
+from common import loadHandler, timeIt
+
+similarity = loadHandler("check_document_similarity")
+labels = ("unrelated", "verbatim", "light edit", "heavy edit", "reordered", "empty")
+emptyWords = ["the", "of", "and", "it", "was", "to", "a", "in", "is", "that", "(it)", "--", "&"]
+
+def labelledDocuments(noOfSentences, seed=0, vocabularySize=3000):
+    # (source text, candidate text, [(label, index of the copied source sentence or -1)] for every candidate sentence)
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(vocabularySize)]
+    weights = 1.0 / np.arange(1, vocabularySize + 1)
+    weights /= weights.sum()
+
+    def sentence():
+        return list(rng.choice(vocabulary, rng.integers(6, 25), p=weights))
+
+    def edit(words, rate):
+        return [vocabulary[rng.integers(vocabularySize)] if rng.random() < rate else word for word in words]
+
+    srcSentences = [sentence() for _ in range(noOfSentences)]
+    candSentences = []
+    truth = []
+    for _ in range(noOfSentences):
+        label = labels[rng.integers(len(labels) - 1)]
+        j = int(rng.integers(noOfSentences))
+        if(label == "unrelated"):
+            candSentences.append(sentence())
+            j = -1
+        elif(label == "verbatim"):
+            candSentences.append(list(srcSentences[j]))
+        elif(label == "light edit"):
+            candSentences.append(edit(srcSentences[j], 0.15))
+        elif(label == "heavy edit"):
+            candSentences.append(edit(srcSentences[j], 0.45))
+        else:
+            candSentences.append([srcSentences[j][k] for k in rng.permutation(len(srcSentences[j]))])
+        truth.append((label, j))
+
+    # Added with an rng of their own, so that the other sentences stay the same. The source ones go at the end, so that
+    # the indices of the copied sentences don't move:
+    emptyRng = np.random.default_rng(seed + 1)
+    for _ in range(noOfSentences // 10):
+        srcSentences.append(list(emptyRng.choice(emptyWords, emptyRng.integers(2, 8))))
+        position = int(emptyRng.integers(len(candSentences) + 1))
+        candSentences.insert(position, list(emptyRng.choice(emptyWords, emptyRng.integers(2, 8))))
+        truth.insert(position, ("empty", -1))
+
+    def document(sentences):
+        return " ".join(" ".join(words).capitalize() + "." for words in sentences)
+
+    return document(srcSentences), document(candSentences), truth
+
+def getReport(matches, srcDoc, candDoc, truth):
+    # A reported match is a true positive when it points to the copied source sentence, duplicated sentences are
+    # compared by their text:
+    srcSentences = similarity.nltk.tokenize.sent_tokenize(srcDoc)
+    candSentences = similarity.nltk.tokenize.sent_tokenize(candDoc)
+    reported = {(m["candidateDocument"], m["sourceDocument"]) for m in matches}
+    reportedCandidates = {m["candidateDocument"] for m in matches}
+    copies = {(candSentences[i], srcSentences[j]) for i, (_, j) in enumerate(truth) if j >= 0}
+    report = {}
+    for label in labels:
+        rows = [(candSentences[i], j) for i, (rowLabel, j) in enumerate(truth) if rowLabel == label]
+        if(label in ("unrelated", "empty")):
+            report[label] = sum(sentence in reportedCandidates for sentence, _ in rows) / max(1, len(rows))
+        else:
+            report[label] = sum((sentence, srcSentences[j]) in reported for sentence, j in rows) / max(1, len(rows))
+    report["precision"] = len(reported & copies) / max(1, len(reported))
+    report["recall"] = len(reported & copies) / max(1, len(copies))
+    return report
+
+def main():
+    noOfSentences = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    srcDoc, candDoc, truth = labelledDocuments(noOfSentences)
+    similarity.computeSimilarity(srcDoc, candDoc, "none", similarity.defaultRecall, 1, "tfidf")
+
+    print(f"{noOfSentences} sentences, share of each label reported (false positive rate for unrelated & empty):")
+    print(f"{'engine':>12} {'time s':>8} {'score':>6} " + " ".join(f"{label:>10}" for label in labels) + f" {'precision':>9} {'recall':>6}")
+    for engine in similarity.engines:
+        elapsed, (score, matches) = timeIt(similarity.computeSimilarity, srcDoc, candDoc, "exact", similarity.defaultRecall, 1, engine, repeat=1)
+        report = getReport(matches, srcDoc, candDoc, truth)
+        print(f"{engine:>12} {elapsed:>8.3f} {score:>6.3f} " + " ".join(f"{report[label]:>10.3f}" for label in labels) + f" {report['precision']:>9.3f} {report['recall']:>6.3f}")
+
+if __name__ == "__main__":
+    main()
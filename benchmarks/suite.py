@@ -0,0 +1,242 @@
+# Benchmark suite of the five forensic algorithms: hideDataToImage, retrieveDataFromImage, embedWaterMarkInHostImage,
+# extractWaterMarkImage & computeSimilarity, called directly on deterministic synthetic inputs (grayscale, BGR & BGRA
+# images from 0.3 to 24 MP, documents from 10 to 5000 sentences), so no bucket is involved.
+# Every case is timed (best of --repeat, with the caches of the handlers cleared before every run), its peak memory is
+# traced with tracemalloc in one more run & its output is hashed and compared with suite_golden.json. The times & peaks are
+# compared with suite_baseline.json. The suite exits with 1 when an output differs, a case is over a threshold or a case
+# has no golden output or baseline yet, so that a build can check it. --update-golden records the outputs of the cases
+# run, --update-baseline their times & peaks (the baseline belongs to one machine, record it again on the machine that
+# runs the suite). Record both with the versions of the requirements, in the image of the similarity function for its
+# nltk corpora (or with NLTK_DATA pointing to the same corpora).
+# tracemalloc sees the numpy arrays, also those returned by cv2, but not the buffers cv2 allocates internally.
+# Usage: python benchmarks/suite.py [--quick] [--repeat n] [--max-slowdown ratio] [--max-memory-growth ratio]
+#        [--min-time-delta seconds] [--update-golden] [--update-baseline] [algorithms ...]
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from common import loadHandler, syntheticDocuments, syntheticImage, syntheticWaterMark
+
+import keyschedule
+
+hide = loadHandler("hide_text_in_image")
+retrieve = loadHandler("retrieve_text_from_image")
+embed = loadHandler("embed_watermark")
+extract = loadHandler("extract_watermark")
+# Loaded only when its cases run, it needs the nltk corpora:
+similarity = None
+
+algorithms = ("hide", "retrieve", "embed", "extract", "similarity")
+imageSizes = [("0.3mp", 480, 640), ("2mp", 1200, 1600), ("6mp", 2000, 3000), ("12mp", 3000, 4000), ("24mp", 4000, 6000)]
+imageKinds = [("gray", 1), ("bgr", 3), ("bgra", 4)]
+documentSizes = [10, 100, 1000, 5000]
+quickMaxPixels = 2000000        # Largest image of --quick
+quickMaxSentences = 1000        # Longest document of --quick
+longCaseSeconds = 10            # A case whose first run takes longer isn't repeated
+warmUpSeconds = 1               # Small images go through the image algorithms for this long before the first case
+secretKey = "suite-key"
+message = "".join(chr(32 + (i * 7) % 95) for i in range(2000))
+
+suiteDir = os.path.dirname(os.path.abspath(__file__))
+goldenPath = os.path.join(suiteDir, "suite_golden.json")
+baselinePath = os.path.join(suiteDir, "suite_baseline.json")
+
+def getEnvironment():
+    # Outputs of the watermark depend on the cv2 & numpy builds, times on the machine:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cv2": cv2.__version__,
+        "machine": platform.machine(),
+        "cpus": len(os.sched_getaffinity(0))
+    }
+
+def loadResults(path):
+    if(not os.path.exists(path)):
+        return {"environment": None, "cases": {}}
+    with open(path) as file:
+        return json.load(file)
+
+def saveResults(path, results, cases):
+    results = {"environment": getEnvironment(), "cases": {**results["cases"], **cases}}
+    with open(path, "w") as file:
+        json.dump(results, file, indent=1, sort_keys=True)
+        file.write("\n")
+
+def hashOutput(output):
+    # Arrays by their dtype, shape & bytes, everything else by its JSON:
+    digest = hashlib.sha256()
+    def add(value):
+        if(isinstance(value, np.ndarray)):
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif(isinstance(value, tuple)):
+            for item in value:
+                add(item)
+        else:
+            digest.update(json.dumps(value, sort_keys=True).encode())
+    add(output)
+    return digest.hexdigest()
+
+def clearCaches():
+    # Every run computes everything, like the first request with a key or a document:
+    keyschedule.cache.clear()
+    if(similarity is not None):
+        similarity.documentCache.clear()
+        similarity.documentCacheStats["chars"] = 0
+        similarity.getLemma.cache_clear()
+
+def measure(function, setup, repeat):
+    # (best time, peak traced bytes, output). setup returns the arguments of a run (e.g. a fresh copy of an image that
+    # the function writes in place) & isn't measured. The traced run goes first & also warms up what cv2 & numpy set up
+    # on first use:
+    args = setup()
+    clearCaches()
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        args = setup()
+        clearCaches()
+        start = time.perf_counter()
+        output = function(*args)
+        best = min(best, time.perf_counter() - start)
+        if(best > longCaseSeconds):
+            break
+    return best, peak, output
+
+def warmUp():
+    # The first cases of a fresh process come out up to twice as slow, even after their own warm-up run:
+    image = syntheticImage(480, 640, 3)
+    waterMark = syntheticWaterMark(128)
+    start = time.perf_counter()
+    while(time.perf_counter() - start < warmUpSeconds):
+        hiddenImage, _ = hide.hideDataToImage(message, secretKey, image.copy())
+        retrieve.retrieveDataFromImage(secretKey, hiddenImage)
+        extract.extractWaterMarkImage(embed.embedWaterMarkInHostImage(image, waterMark, secretKey), secretKey)
+
+def runImageCases(selected, quick, run):
+    waterMark = syntheticWaterMark(128)
+    for sizeName, height, width in imageSizes:
+        if(quick and height * width > quickMaxPixels):
+            continue
+        for kindName, channels in imageKinds:
+            name = f"{kindName}-{sizeName}"
+            image = syntheticImage(height, width, channels)
+            if("hide" in selected):
+                # hideDataToImage writes into the image:
+                run(f"hide/{name}", hide.hideDataToImage, lambda: (message, secretKey, image.copy()))
+            if("retrieve" in selected):
+                hiddenImage, _ = hide.hideDataToImage(message, secretKey, image.copy())
+                output = run(f"retrieve/{name}", retrieve.retrieveDataFromImage, lambda: (secretKey, hiddenImage))
+                assert output == (False, message), f"retrieve/{name} didn't return the hidden message"
+            if("embed" in selected):
+                run(f"embed/{name}", embed.embedWaterMarkInHostImage, lambda: (image, waterMark, secretKey))
+            if("extract" in selected):
+                embeddedImage = embed.embedWaterMarkInHostImage(image, waterMark, secretKey)
+                run(f"extract/{name}", extract.extractWaterMarkImage, lambda: (embeddedImage, secretKey))
+
+def runDocumentCases(quick, run):
+    global similarity
+    similarity = loadHandler("check_document_similarity")
+    # The corpora are loaded on first use, keep them out of the peak of the first case:
+    similarity.warmUp()
+    for noOfSentences in documentSizes:
+        if(quick and noOfSentences > quickMaxSentences):
+            continue
+        srcDoc, candDoc = syntheticDocuments(noOfSentences, seed=noOfSentences)
+        # The serial path: worker processes depend on the cpus of the machine & are invisible to tracemalloc:
+        run(f"similarity/{noOfSentences}-sentences", similarity.computeSimilarity, lambda: (srcDoc, candDoc, "exact", similarity.defaultRecall, 1))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help=f"images up to {quickMaxPixels} pixels & documents up to {quickMaxSentences} sentences")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-slowdown", type=float, default=1.5, help="time over the baseline that fails a case")
+    parser.add_argument("--max-memory-growth", type=float, default=1.10, help="peak memory over the baseline that fails a case")
+    parser.add_argument("--min-time-delta", type=float, default=0.01, help="seconds a case may always be slower by, the shortest cases vary by several ms from run to run")
+    parser.add_argument("--update-golden", action="store_true")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("algorithms", nargs="*", default=algorithms)
+    args = parser.parse_args()
+    if(any(algorithm not in algorithms for algorithm in args.algorithms)):
+        parser.error(f"algorithms must be some of {', '.join(algorithms)}")
+
+    golden = loadResults(goldenPath)
+    baseline = loadResults(baselinePath)
+    environment = getEnvironment()
+    print(f"environment: {json.dumps(environment)}")
+    versions = ("python", "numpy", "cv2")
+    if(golden["environment"] is not None and any(golden["environment"].get(name) != environment[name] for name in versions)):
+        print(f"golden outputs recorded with {json.dumps(golden['environment'])}, the watermark outputs may differ")
+
+    newGolden = {}
+    newBaseline = {}
+    failures = []
+    print(f"{'case':<28} {'ms':>10} {'peak MiB':>9} {'base ms':>10} {'time':>6} {'memory':>6}  output")
+
+    def isSlower(seconds, reference):
+        return seconds > reference["seconds"] * args.max_slowdown and seconds - reference["seconds"] > args.min_time_delta
+
+    def run(caseId, function, setup):
+        reference = baseline["cases"].get(caseId)
+        seconds, peak, output = measure(function, setup, args.repeat)
+        if(reference is not None and isSlower(seconds, reference) and seconds <= longCaseSeconds):
+            # Measured once more before it fails, other load on the machine can slow down every run of a short case:
+            seconds = min(seconds, measure(function, setup, args.repeat)[0])
+        outputHash = hashOutput(output)
+        newGolden[caseId] = outputHash
+        newBaseline[caseId] = {"seconds": round(seconds, 6), "peakBytes": peak}
+
+        goldenHash = golden["cases"].get(caseId)
+        outputStatus = "new" if goldenHash is None else ("ok" if goldenHash == outputHash else "DIFFERS")
+        if(outputStatus == "DIFFERS"):
+            failures.append(("output", f"{caseId}: output differs from the golden output"))
+        elif(outputStatus == "new"):
+            failures.append(("output", f"{caseId}: no golden output, record it with --update-golden"))
+
+        baseTime, timeRatio, memoryRatio = "-", "-", "-"
+        if(reference is None):
+            failures.append(("baseline", f"{caseId}: not in the baseline, record it with --update-baseline"))
+        else:
+            baseTime = f"{reference['seconds']*1000:.2f}"
+            timeRatio = f"{seconds / reference['seconds']:.2f}"
+            memoryRatio = f"{peak / max(1, reference['peakBytes']):.2f}"
+            if(isSlower(seconds, reference)):
+                failures.append(("baseline", f"{caseId}: {seconds*1000:.2f} ms against {reference['seconds']*1000:.2f} ms in the baseline"))
+            if(peak > reference["peakBytes"] * args.max_memory_growth):
+                failures.append(("baseline", f"{caseId}: peak of {peak/2**20:.2f} MiB against {reference['peakBytes']/2**20:.2f} MiB in the baseline"))
+        print(f"{caseId:<28} {seconds*1000:>10.2f} {peak/2**20:>9.2f} {baseTime:>10} {timeRatio:>6} {memoryRatio:>6}  {outputStatus}", flush=True)
+        return output
+
+    warmUp()
+    runImageCases(args.algorithms, args.quick, run)
+    if("similarity" in args.algorithms):
+        runDocumentCases(args.quick, run)
+
+    if(args.update_golden):
+        saveResults(goldenPath, golden, newGolden)
+        print(f"recorded {len(newGolden)} outputs in {goldenPath}")
+    if(args.update_baseline):
+        saveResults(baselinePath, baseline, newBaseline)
+        print(f"recorded {len(newBaseline)} cases in {baselinePath}")
+    # What was just recorded doesn't fail the run:
+    failures = [text for kind, text in failures if not (kind == "output" and args.update_golden) and not (kind == "baseline" and args.update_baseline)]
+    if(failures):
+        print("\n".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,37 @@
 import json
 import nltk
 import re
+import os
+import hashlib
+import functools
+import collections
+import numpy as np
 
 lowerThreshold = 0.40   
-stopWords = set(nltk.corpus.stopwords.words("english"))      
+pruningModes = ("exact", "approximate", "none")
+engines = ("levenshtein", "tfidf")
+tfidfThreshold = 0.50   # Cosine similarity above which the tfidf engine reports a match
+tfidfBlockSize = 2048   # Number of candidate sentences multiplied with the source matrix at once
+defaultRecall = 0.95    # Target probability for the approximate mode to keep a source sentence that can exceed lowerThreshold
+noOfMinHashes = 64      # Length of the MinHash signature of a sentence in the approximate mode
+minHashPrime = (1 << 31) - 1
+
+# Caches kept across warm invocations of the container:
+lemmaCacheSize = int(os.environ.get("LEMMA_CACHE_SIZE", 100000))                # Number of word -> lemma entries
+documentCacheSize = int(os.environ.get("DOCUMENT_CACHE_SIZE", 32))               # Number of preprocessed documents
+documentCacheMaxChars = int(os.environ.get("DOCUMENT_CACHE_MAX_CHARS", 5000000)) # Total length of the preprocessed documents
+maxVocabularySize = int(os.environ.get("MAX_VOCABULARY_SIZE", 1000000))         # Number of word ids before all the caches are reset
+
+# Sharding of the candidate sentences across processes:
+warmUpOnInit = os.environ.get("WARM_UP_ON_INIT", "false").lower() == "true"    # Load the corpora at init, e.g. with provisioned concurrency
+maxWorkers = int(os.environ.get("MAX_WORKERS", 0))                              # 0 uses every available cpu
+minParallelPairs = int(os.environ.get("MIN_PARALLEL_PAIRS", 250000))           # Number of sentence pairs below which it stays serial
+
+punctuation = re.compile(r'[^\w\s]')
+lemmatizer = nltk.stem.WordNetLemmatizer()
+vocabulary = {}                             # word -> integer id, shared by all the cached documents
+documentCache = collections.OrderedDict()   # sha256 of the text -> (preprocessed document, length of the text)
+documentCacheStats = {"hits": 0, "misses": 0, "chars": 0}
 
 def sendErrorResponse(statusCode, errMessage):
     return {
@@ -15,91 +43,439 @@ def sendErrorResponse(statusCode, errMessage):
         ),
     }
 
+@functools.lru_cache(maxsize=None)
+def getStopWords():
+    # Read from the corpus baked into the image on first use instead of at import:
+    return frozenset(nltk.corpus.stopwords.words("english"))
+
+@functools.lru_cache(maxsize=lemmaCacheSize)
+def getLemma(word):
+    return lemmatizer.lemmatize(word)
+
 def cleanData(lines):
-    lemmatizer = nltk.stem.WordNetLemmatizer()
     finalLines = []
+    stopWords = getStopWords()
 
     for line in lines:
         # Remove the punctuation from the lines:
-        line = re.sub(r'[^\w\s]', '', line)
-        result = ""
+        line = punctuation.sub('', line)
+        result = []
         wordList = line.split(" ")
         for word in wordList:
             # Convert string to lower case characters:
             resultantWord = word.lower()
-            # Remove stop words:
-            if(resultantWord in stopWords):
-                resultantWord = ""
+            # Remove stop words (and the empty words left by repeated spaces):
+            if(len(resultantWord)==0 or resultantWord in stopWords):
+                continue
             # Perfrom Lemmatization:
-            resultantWord = lemmatizer.lemmatize(resultantWord)
+            resultantWord = getLemma(resultantWord)
             if(len(resultantWord)!=0):
-                if(len(result)==0):
-                    result = resultantWord
-                else:
-                    result += " " + resultantWord
-        finalLines.append(result)
+                result.append(resultantWord)
+        finalLines.append(" ".join(result))
 
     return finalLines
 
-def access(i, j, dp):
-    if(i>=0 and j>=0):
-        return dp[i][j]
-    elif(j >=0):
-        return j+1
-    else:
-        return i+1
+def encodeSentences(sentences, vocabulary):
+    # Every word of the cleaned sentences is replaced by its integer id in the vocabulary:
+    return [tuple(vocabulary.setdefault(word, len(vocabulary)) for word in sentence.split(" ")) for sentence in sentences]
+
+def getPatternMasks(words):
+    # word -> bitmask of the positions where it occurs in the sentence
+    masks = {}
+    for i, word in enumerate(words):
+        masks[word] = masks.get(word, 0) | (1 << i)
+    return masks
+
+def getEditDistance(patternMasks, patternLength, words, maxDistance):
+    # Word level Levenshtein distance with the bit-parallel algorithm of Myers / Hyyro, one column of the dp per word of `words`.
+    # Returns None as soon as the distance is known to exceed maxDistance.
+    if(abs(patternLength - len(words)) > maxDistance):
+        return None
+    allBits = (1 << patternLength) - 1
+    lastBit = 1 << (patternLength - 1)
+    VP = allBits
+    VN = 0
+    distance = patternLength
+    remaining = len(words)
+    for word in words:
+        Eq = patternMasks.get(word, 0)
+        Xv = Eq | VN
+        Xh = (((Eq & VP) + VP) ^ VP) | Eq
+        Ph = (VN | ~(Xh | VP)) & allBits
+        Mh = VP & Xh
+        if(Ph & lastBit):
+            distance += 1
+        elif(Mh & lastBit):
+            distance -= 1
+        Ph = ((Ph << 1) | 1) & allBits
+        Mh = (Mh << 1) & allBits
+        VP = (Mh | ~(Xv | Ph)) & allBits
+        VN = Ph & Xv
+        # Every remaining word can lower the distance by at most 1:
+        remaining -= 1
+        if(distance - remaining > maxDistance):
+            return None
+    return distance
+
+def getMaxDistance(length, bestSimilarity, allowTie):
+    # Largest distance whose similarity still beats (or ties, when allowTie) bestSimilarity:
+    maxDistance = min(length, int((1 - bestSimilarity) * length) + 1)
+    while(maxDistance >= 0):
+        similarity = 1 - maxDistance/length
+        if(similarity > bestSimilarity or (allowTie and similarity == bestSimilarity)):
+            break
+        maxDistance -= 1
+    return maxDistance
+
+def getSimilarity(patternMasks, patternLength, words, bestSimilarity=-1.0, allowTie=False):
+    # Same as levenshtein_similarity on encoded sentences, returns None when it can't beat bestSimilarity:
+    length = max(patternLength, len(words))
+    distance = getEditDistance(patternMasks, patternLength, words, getMaxDistance(length, bestSimilarity, allowTie))
+    if(distance is None):
+        return None
+    return 1 - distance/length
 
 # 1. One of the possible way of comparing sentences:
 def levenshtein_similarity(sentence1, sentence2):
-    sentence1 = sentence1.split(" ")
-    sentence2 = sentence2.split(" ")
-    if(len(sentence1)==0):
-        return len(sentence2)
-    if(len(sentence2)==0):
-        return len(sentence1)
-    dp = [[0]*len(sentence2) for _ in range(len(sentence1))]
-    for i in range(len(sentence1)):
-        for j in range(len(sentence2)):
-            if(sentence1[i]==sentence2[j]):
-                dp[i][j] = access(i-1, j-1, dp)
+    sentence1, sentence2 = encodeSentences([sentence1, sentence2], {})
+    return getSimilarity(getPatternMasks(sentence1), len(sentence1), sentence2)
+
+def buildInvertedIndex(srcSentences):
+    # word -> [(index of source sentence, count of the word in it)]
+    invertedIndex = {}
+    for j, words in enumerate(srcSentences):
+        for word, count in countWords(words).items():
+            invertedIndex.setdefault(word, []).append((j, count))
+    return invertedIndex
+
+def countWords(words):
+    counts = {}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1
+    return counts
+
+def getUpperBounds(candWords, srcSentences, invertedIndex, allowedSources=None):
+    # An alignment with m matching words costs at least max(len1, len2) - m edits & m can't exceed the words shared by both sentences,
+    # so the similarity is at most shared / max(len1, len2). Sentences sharing no word have a similarity of exactly 0.
+    sharedWords = {}
+    for word, count in countWords(candWords).items():
+        for j, srcCount in invertedIndex.get(word, ()):
+            if(allowedSources is None or j in allowedSources):
+                sharedWords[j] = sharedWords.get(j, 0) + min(count, srcCount)
+    return {j: shared / max(len(candWords), len(srcSentences[j])) for j, shared in sharedWords.items()}
+
+def findBestMatch(candWords, srcSentences, upperBounds):
+    # Visit the source sentences from the highest upper bound and stop once no remaining one can reach the best similarity.
+    # Ties go to the lowest index, same as scanning all the source sentences in order.
+    patternMasks = getPatternMasks(candWords)
+    similarity = 0.0
+    expectedMatchIndex = -1
+    for j in sorted(upperBounds, key=lambda j: (-upperBounds[j], j)):
+        if(upperBounds[j] + 1e-9 < similarity):
+            break
+        allowTie = similarity > 0 and j < expectedMatchIndex
+        currentSimilarity = getSimilarity(patternMasks, len(candWords), srcSentences[j], similarity, allowTie)
+        if(currentSimilarity is not None):
+            similarity = currentSimilarity
+            expectedMatchIndex = j
+    return similarity, expectedMatchIndex
+
+def getBandSize(recall):
+    # Sentences with a similarity above lowerThreshold have a word Jaccard similarity of at least about t / (2 - t).
+    # Use the longest bands (fewest candidates) that still collide with probability >= recall at that Jaccard similarity:
+    jaccard = lowerThreshold / (2 - lowerThreshold)
+    for rows in range(noOfMinHashes, 0, -1):
+        bands = noOfMinHashes // rows
+        if(1 - (1 - jaccard**rows)**bands >= recall):
+            return rows
+    return 1
+
+def getMinHashSignatures(sentences):
+    rng = np.random.default_rng(0)
+    a = rng.integers(1, minHashPrime, noOfMinHashes, dtype=np.int64)
+    b = rng.integers(0, minHashPrime, noOfMinHashes, dtype=np.int64)
+    signatures = np.empty((len(sentences), noOfMinHashes), dtype=np.int64)
+    for i, words in enumerate(sentences):
+        wordIds = np.array(list(set(words)), dtype=np.int64)
+        signatures[i] = ((np.outer(wordIds, a) + b) % minHashPrime).min(axis=0)
+    return signatures
+
+def getLSHBuckets(srcSentences, rows):
+    # (band, MinHash values of the band) -> indices of the source sentences
+    buckets = {}
+    for j, signature in enumerate(getMinHashSignatures(srcSentences)):
+        for band in range(noOfMinHashes // rows):
+            buckets.setdefault((band, signature[band*rows:(band+1)*rows].tobytes()), []).append(j)
+    return buckets
+
+def getLSHCandidates(candSentences, buckets, rows):
+    # Source sentences that share at least one MinHash band with each candidate sentence:
+    candSignatures = getMinHashSignatures(candSentences)
+    candidates = []
+    for signature in candSignatures:
+        sources = set()
+        for band in range(noOfMinHashes // rows):
+            sources.update(buckets.get((band, signature[band*rows:(band+1)*rows].tobytes()), ()))
+        candidates.append(sources)
+    return candidates
+
+def getSourceIndex(srcSentences, pruning="exact", recall=defaultRecall):
+    # What matching needs of the encoded source sentences, built once for any number of candidate sentences:
+    sourceIndex = {"sentences": srcSentences, "pruning": pruning}
+    if(pruning != "none"):
+        sourceIndex["invertedIndex"] = buildInvertedIndex(srcSentences)
+    if(pruning == "approximate"):
+        sourceIndex["rows"] = getBandSize(recall)
+        sourceIndex["buckets"] = getLSHBuckets(srcSentences, sourceIndex["rows"])
+    return sourceIndex
+
+def matchSentences(srcSentences, candSentences, pruning="exact", recall=defaultRecall):
+    # Best (similarity, index of source sentence) for every encoded candidate sentence
+    return matchCandidates(getSourceIndex(srcSentences, pruning, recall), candSentences)
+
+def matchCandidates(sourceIndex, candSentences):
+    # Same as matchSentences, against a source index of getSourceIndex:
+    srcSentences = sourceIndex["sentences"]
+    pruning = sourceIndex["pruning"]
+    if(pruning == "none"):
+        bestMatches = []
+        for candWords in candSentences:
+            patternMasks = getPatternMasks(candWords)
+            similarity = 0.0
+            expectedMatchIndex = -1
+            for j in range(len(srcSentences)):
+                currentSimilarity = getSimilarity(patternMasks, len(candWords), srcSentences[j], similarity)
+                if(currentSimilarity is not None):
+                    similarity = currentSimilarity
+                    expectedMatchIndex = j
+            bestMatches.append((similarity, expectedMatchIndex))
+        return bestMatches
+
+    invertedIndex = sourceIndex["invertedIndex"]
+    candidates = getLSHCandidates(candSentences, sourceIndex["buckets"], sourceIndex["rows"]) if pruning == "approximate" else [None]*len(candSentences)
+
+    bestMatches = []
+    for i in range(len(candSentences)):
+        upperBounds = getUpperBounds(candSentences[i], srcSentences, invertedIndex, candidates[i])
+        if(pruning == "approximate"):
+            # Only the sentences that can still be reported as matches are compared:
+            upperBounds = {j: upperBound for j, upperBound in upperBounds.items() if upperBound > lowerThreshold}
+        bestMatches.append(findBestMatch(candSentences[i], srcSentences, upperBounds))
+    return bestMatches
+
+def getTermMatrix(sentences, noOfWords, emptyWord=None):
+    import scipy.sparse
+    # Sparse sentence x word matrix of term counts, duplicate (row, col) entries are summed by the conversion.
+    # emptyWord is left out, so that the sentences cleaned down to nothing get an empty row:
+    lengths = [len(words) for words in sentences]
+    rows = np.repeat(np.arange(len(sentences)), lengths)
+    cols = np.fromiter((word for words in sentences for word in words), dtype=np.int64, count=sum(lengths))
+    kept = cols != emptyWord if emptyWord is not None else slice(None)
+    return scipy.sparse.csr_matrix((np.ones(len(cols))[kept], (rows[kept], cols[kept])), shape=(len(sentences), noOfWords))
+
+def matchSentencesTfidf(srcSentences, candSentences, emptyWord=None):
+    # Best (cosine similarity, index of source sentence) for every encoded candidate sentence, from tfidf sentence vectors.
+    # emptyWord is the id of "", the encoding of a sentence of only stop words or punctuation, which matches nothing.
+    # scipy is only imported by the requests that use this engine:
+    import scipy.sparse
+    noOfWords = 1 + max(max(words) for words in srcSentences + candSentences)
+    srcMatrix = getTermMatrix(srcSentences, noOfWords, emptyWord)
+    candMatrix = getTermMatrix(candSentences, noOfWords, emptyWord)
+
+    # Smoothed idf over the sentences of both documents & l2 normalised rows, so that the dot product is the cosine:
+    documentFrequency = np.bincount(srcMatrix.indices, minlength=noOfWords) + np.bincount(candMatrix.indices, minlength=noOfWords)
+    idf = scipy.sparse.diags(np.log((1 + len(srcSentences) + len(candSentences)) / (1 + documentFrequency)) + 1)
+    matrices = []
+    for matrix in (srcMatrix, candMatrix):
+        matrix = matrix @ idf
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        matrices.append(scipy.sparse.diags(1 / np.maximum(norms, np.finfo(np.float64).eps)) @ matrix)
+    srcMatrix, candMatrix = matrices
+
+    # One sparse product for every block of candidate sentences, the row wise maxima are the best matches:
+    bestMatches = []
+    srcMatrixTransposed = srcMatrix.T.tocsc()
+    for start in range(0, len(candSentences), tfidfBlockSize):
+        similarities = (candMatrix[start:start+tfidfBlockSize] @ srcMatrixTransposed).tocsr()
+        maxima = similarities.max(axis=1).toarray().ravel()
+        indices = np.asarray(similarities.argmax(axis=1)).ravel()
+        bestMatches.extend((float(similarity), int(j) if similarity > 0 else -1) for similarity, j in zip(maxima, indices))
+    return bestMatches
+
+def getNoOfWorkers(noOfPairs):
+    # Lambda gives one vcpu for every 1769 MB of memory, a process per available cpu & none for small documents:
+    if(noOfPairs < minParallelPairs):
+        return 1
+    noOfCpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    return max(1, min(noOfCpus, maxWorkers) if maxWorkers > 0 else noOfCpus)
+
+def matchSentencesWorker(connection, sourceIndex):
+    # Inherits the source index from the fork & sends back the best matches of every shard of candidate sentences it
+    # receives, until None:
+    try:
+        while(True):
+            candSentences = connection.recv()
+            if(candSentences is None):
+                break
+            try:
+                connection.send((None, matchCandidates(sourceIndex, candSentences)))
+            except Exception as e:
+                connection.send((str(e), None))
+    except EOFError:
+        pass
+    finally:
+        connection.close()
+
+class MatchingWorkers:
+    # Matches batches of candidate sentences against one source: the source index is built once & the workers are forked
+    # once with it, then every batch is sharded across the same pipes. Close it after the last batch.
+    # Lambda has no /dev/shm, so multiprocessing.Pool & Queue can't be used, every worker talks over its own Pipe.
+    def __init__(self, srcSentences, pruning="exact", recall=defaultRecall, noOfWorkers=1):
+        self.sourceIndex = getSourceIndex(srcSentences, pruning, recall)
+        self.workers = []
+        if(noOfWorkers <= 1):
+            return
+        import multiprocessing
+        context = multiprocessing.get_context("fork")
+        try:
+            for _ in range(noOfWorkers):
+                parentConnection, childConnection = context.Pipe()
+                process = context.Process(target=matchSentencesWorker, args=(childConnection, self.sourceIndex), daemon=True)
+                process.start()
+                childConnection.close()
+                self.workers.append((process, parentConnection))
+        except Exception:
+            self.close()
+            raise
+
+    def match(self, candSentences):
+        if(len(self.workers) == 0 or len(candSentences) < 2):
+            return matchCandidates(self.sourceIndex, candSentences)
+        shardSize = -(-len(candSentences) // len(self.workers))
+        shards = [candSentences[start:start+shardSize] for start in range(0, len(candSentences), shardSize)]
+        for (process, parentConnection), shard in zip(self.workers, shards):
+            parentConnection.send(shard)
+
+        # The shards are contiguous, so concatenating them in order gives the same result as the serial path. Every
+        # answer is read, so that the pipes stay in step for the next batch:
+        bestMatches = []
+        errMessages = []
+        for (process, parentConnection), shard in zip(self.workers, shards):
+            errMessage, shardMatches = parentConnection.recv()
+            if(errMessage is not None):
+                errMessages.append(errMessage)
             else:
-                dp[i][j] = 1 + min(min(access(i-1, j-1, dp), access(i-1, j, dp)), access(i, j-1, dp))
-    distance = dp[len(sentence1)-1][len(sentence2)-1]/max(len(sentence1), len(sentence2))
-    return 1-distance
+                bestMatches.extend(shardMatches)
+        if(errMessages):
+            raise RuntimeError(errMessages[0])
+        return bestMatches
+
+    def close(self):
+        for process, parentConnection in self.workers:
+            try:
+                parentConnection.send(None)
+            except OSError:
+                pass
+            parentConnection.close()
+        for process, parentConnection in self.workers:
+            process.join(timeout=1)
+            if(process.is_alive()):
+                process.kill()
+        self.workers = []
+
+def matchSentencesInParallel(srcSentences, candSentences, pruning="exact", recall=defaultRecall, noOfWorkers=1):
+    if(noOfWorkers <= 1 or len(candSentences) < 2):
+        return matchSentences(srcSentences, candSentences, pruning, recall)
+    # No more workers than shards:
+    shardSize = -(-len(candSentences) // noOfWorkers)
+    workers = MatchingWorkers(srcSentences, pruning, recall, -(-len(candSentences) // shardSize))
+    try:
+        return workers.match(candSentences)
+    finally:
+        workers.close()
+
+def getPreprocessedDocument(text):
+    # (sentences, cleaned sentences, encoded sentences) of the text, cached by the hash of its content:
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if(key in documentCache):
+        documentCacheStats["hits"] += 1
+        documentCache.move_to_end(key)
+        return documentCache[key][0]
+
+    documentCacheStats["misses"] += 1
+    sentences = nltk.tokenize.sent_tokenize(text)
+    cleanedSentences = cleanData(sentences)
+    document = (sentences, cleanedSentences, encodeSentences(cleanedSentences, vocabulary))
+
+    # Keep the most recently used documents within the size limits:
+    if(len(text) <= documentCacheMaxChars):
+        documentCache[key] = (document, len(text))
+        documentCacheStats["chars"] += len(text)
+        while(len(documentCache) > documentCacheSize or documentCacheStats["chars"] > documentCacheMaxChars):
+            _, (_, size) = documentCache.popitem(last=False)
+            documentCacheStats["chars"] -= size
+    return document
+
+def resetCachesIfNeeded():
+    # The cached encodings refer to the vocabulary, so they are dropped along with it:
+    if(len(vocabulary) > maxVocabularySize):
+        vocabulary.clear()
+        documentCache.clear()
+        documentCacheStats["chars"] = 0
 
-def computeSimilarity(srcDoc, candDoc):
+def getCacheStats():
+    lemmaCacheInfo = getLemma.cache_info()
+    return {
+        "lemmaHits": lemmaCacheInfo.hits,
+        "lemmaMisses": lemmaCacheInfo.misses,
+        "documentHits": documentCacheStats["hits"],
+        "documentMisses": documentCacheStats["misses"]
+    }
+
+def computeSimilarity(srcDoc, candDoc, pruning="exact", recall=defaultRecall, noOfWorkers=None, engine="levenshtein"):
     # Suspected instances of plagarism:
     matches = []
 
-    # Sentence tokenise the file data:
-    srcDocTokenised = nltk.tokenize.sent_tokenize(srcDoc)
-    candDocTokenised = nltk.tokenize.sent_tokenize(candDoc)
-
-    # Word Tokenise each sentence:
-    srcDocTokenisedCleaned = cleanData(srcDocTokenised)
-    candDocTokenisedCleaned = cleanData(candDocTokenised)
+    # Sentence tokenise, clean & encode the file data:
+    resetCachesIfNeeded()
+    srcDocTokenised, _, srcDocEncoded = getPreprocessedDocument(srcDoc)
+    candDocTokenised, _, candDocEncoded = getPreprocessedDocument(candDoc)
 
     # Get the similarity for lines in the candidate document from source document:
     globalSimilarity  = 0.0
-    for i in range(len(candDocTokenisedCleaned)):
-        similarity = 0.0
-        expectedMatchIndex = -1
-        for j in range(len(srcDocTokenisedCleaned)):
-            currentSimilarity = levenshtein_similarity(candDocTokenisedCleaned[i], srcDocTokenisedCleaned[j])
-            if(similarity < currentSimilarity):
-                similarity = currentSimilarity
-                expectedMatchIndex = j
+    if(engine == "tfidf"):
+        bestMatches = matchSentencesTfidf(srcDocEncoded, candDocEncoded, vocabulary.get(""))
+        threshold = tfidfThreshold
+    else:
+        if(noOfWorkers is None):
+            noOfWorkers = getNoOfWorkers(len(srcDocEncoded) * len(candDocEncoded))
+        bestMatches = matchSentencesInParallel(srcDocEncoded, candDocEncoded, pruning, recall, noOfWorkers)
+        threshold = lowerThreshold
+    for i, (similarity, expectedMatchIndex) in enumerate(bestMatches):
         globalSimilarity += similarity
-        if(similarity > lowerThreshold):
+        if(similarity > threshold):
             matches.append({"sourceDocument": srcDocTokenised[expectedMatchIndex], "candidateDocument":candDocTokenised[i]})
     
     # Get the average similarity score:
-    globalSimilarity = globalSimilarity / len(candDocTokenisedCleaned)
+    globalSimilarity = globalSimilarity / len(candDocEncoded)
 
     return globalSimilarity, matches
 
 
+def isWarmUpEvent(event):
+    # {"warmUp": true} sent directly or by a scheduled rule, which also sets source to aws.events:
+    return isinstance(event, dict) and (event.get("warmUp") is True or event.get("source") == "aws.events")
+
+def warmUp():
+    # Loads the stop words, the punkt model & wordnet, which the first request would otherwise wait for:
+    getStopWords()
+    lemmatizer.lemmatize("warming")
+    nltk.tokenize.sent_tokenize("Warm up. Done.")
+
 def lambda_handler(event, context):
+    if(isWarmUpEvent(event)):
+        warmUp()
+        return {"statusCode": 200, "body": json.dumps({"message": "warm"})}
     body = json.loads(event['body'])
 
     # Handle error cases:
@@ -108,8 +484,25 @@ def lambda_handler(event, context):
 
     if("candText" not in body):
         return sendErrorResponse(400, "Missing: candText field not provided")
+
+    # The exact pruning gives the same result as comparing all the pairs, the approximate one trades recall of the matches
+    # for speed & only counts the similarity of sentences that can exceed lowerThreshold:
+    pruning = body.get("pruning", "exact")
+    if(pruning not in pruningModes):
+        return sendErrorResponse(400, "pruning must be one of exact, approximate or none")
+
+    recall = body.get("recall", defaultRecall)
+    if(not isinstance(recall, (int, float)) or recall <= 0 or recall > 1):
+        return sendErrorResponse(400, "recall must be in (0, 1]")
+
+    # The tfidf engine scores bags of words with one sparse matrix product, for a fast document level triage:
+    engine = body.get("engine", "levenshtein")
+    if(engine not in engines):
+        return sendErrorResponse(400, "engine must be either levenshtein or tfidf")
     
-    similarity, matches = computeSimilarity(body["srcText"], body["candText"])
+    cacheStatsBefore = getCacheStats()
+    similarity, matches = computeSimilarity(body["srcText"], body["candText"], pruning, recall, engine=engine)
+    cacheStats = {name: count - cacheStatsBefore[name] for name, count in getCacheStats().items()}
 
     return {
         "statusCode": 200,
@@ -123,7 +516,12 @@ def lambda_handler(event, context):
             {
                 "message": "success",
                 "similarity": similarity,
-                "matches": matches
+                "matches": matches,
+                "cacheStats": cacheStats
             }
         ),
-    }
\ No newline at end of file
+    }
+
+# With provisioned concurrency the init phase runs ahead of the requests:
+if(warmUpOnInit):
+    warmUp()
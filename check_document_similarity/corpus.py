@@ -0,0 +1,301 @@
+import io
+import os
+import json
+import nltk
+import numpy as np
+
+import app
+
+# Corpus mode: one candidate document against a library of pre-indexed source documents.
+# The index is a manifest listing immutable segments, every ingest request appends one segment.
+manifestName = "manifest.json"
+defaultTopK = 10        # Number of source documents compared sentence by sentence with the candidate
+maxTopK = 100
+bucket_name = os.environ.get("CORPUS_INDEX_BUCKET", "forensic-tools-corpus-index")  # Not the public bucket, it expires objects after a day
+indexPrefix = os.environ.get("CORPUS_INDEX_PREFIX", "corpus-index/")
+indexDir = os.environ.get("CORPUS_INDEX_DIR")      # Local directory used instead of the bucket, for tests
+
+class LocalIndexStore:
+    def __init__(self, rootDir):
+        self.rootDir = rootDir
+
+    def get(self, name):
+        path = os.path.join(self.rootDir, name)
+        if(not os.path.exists(path)):
+            return None
+        with open(path, "rb") as file:
+            return file.read()
+
+    def put(self, name, data):
+        os.makedirs(self.rootDir, exist_ok=True)
+        # Write to a temporary file first, so that a reader never sees half a segment or manifest:
+        path = os.path.join(self.rootDir, name)
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+
+class S3IndexStore:
+    def __init__(self, bucketName, prefix):
+        import boto3
+        self.s3 = boto3.client('s3')
+        self.bucketName = bucketName
+        self.prefix = prefix
+
+    def get(self, name):
+        try:
+            return self.s3.get_object(Bucket=self.bucketName, Key=self.prefix + name)['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def put(self, name, data):
+        self.s3.put_object(Bucket=self.bucketName, Key=self.prefix + name, Body=data)
+
+def getIndexStore():
+    if(indexDir):
+        return LocalIndexStore(indexDir)
+    return S3IndexStore(bucket_name, indexPrefix)
+
+def packStrings(strings):
+    # A list of strings as one utf-8 blob & the offsets of every string in it:
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(data) for data in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def unpackString(blob, offsets, i):
+    return blob[offsets[i]:offsets[i+1]].tobytes().decode("utf-8")
+
+def readManifest(store):
+    data = store.get(manifestName)
+    if(data is None):
+        return {"version": 0, "segments": []}
+    return json.loads(data)
+
+def buildSegment(documents):
+    # documents: [{"documentId": ..., "text": ...}] -> compressed npz with the sentences, the vocabulary of the segment
+    # and every cleaned sentence as ids into that vocabulary
+    words = {}
+    sentences = []
+    tokenIds = []
+    tokenOffsets = [0]
+    docSentenceOffsets = [0]
+    for document in documents:
+        documentSentences = nltk.tokenize.sent_tokenize(document["text"])
+        for sentence, cleanedSentence in zip(documentSentences, app.cleanData(documentSentences)):
+            sentences.append(sentence)
+            tokenIds.extend(words.setdefault(word, len(words)) for word in cleanedSentence.split(" "))
+            tokenOffsets.append(len(tokenIds))
+        docSentenceOffsets.append(len(sentences))
+
+    sentenceBlob, sentenceOffsets = packStrings(sentences)
+    wordBlob, wordOffsets = packStrings(list(words))
+    docIdBlob, docIdOffsets = packStrings([document["documentId"] for document in documents])
+    segment = io.BytesIO()
+    np.savez_compressed(
+        segment,
+        docIdBlob=docIdBlob, docIdOffsets=docIdOffsets,
+        docSentenceOffsets=np.array(docSentenceOffsets, dtype=np.int64),
+        sentenceBlob=sentenceBlob, sentenceOffsets=sentenceOffsets,
+        wordBlob=wordBlob, wordOffsets=wordOffsets,
+        tokenIds=np.array(tokenIds, dtype=np.int32), tokenOffsets=np.array(tokenOffsets, dtype=np.int64)
+    )
+    return segment.getvalue()
+
+def ingestDocuments(store, documents):
+    # Appends one segment, the existing segments are never rewritten. The manifest is read & written without a condition,
+    # so there must be a single writer: the ingest function has a reserved concurrency of 1 (see template.yaml):
+    manifest = readManifest(store)
+    version = manifest["version"] + 1
+    segmentName = f"segment-{version:06d}.npz"
+    store.put(segmentName, buildSegment(documents))
+    manifest = {
+        "version": version,
+        "segments": manifest["segments"] + [segmentName],
+        "noOfDocuments": manifest.get("noOfDocuments", 0) + len(documents)
+    }
+    store.put(manifestName, json.dumps(manifest).encode())
+    return manifest
+
+# Index loaded in the container, only the segments added since the last request are read:
+loadedIndex = {
+    "segments": [],         # names of the loaded segments
+    "segmentData": [],      # arrays of every loaded segment, token ids mapped to the corpus vocabulary
+    "vocabulary": {},       # word -> corpus id
+    "documents": [],        # (documentId, segment index, document index in the segment)
+    "documentById": {},     # documentId -> index in documents, the latest ingest of an id wins
+    "wordDocuments": None,  # (corpus word ids sorted, document indices) of every distinct word of every document
+}
+
+def loadSegment(data):
+    arrays = dict(np.load(io.BytesIO(data), allow_pickle=False))
+    vocabulary = loadedIndex["vocabulary"]
+    wordBlob, wordOffsets = arrays.pop("wordBlob"), arrays.pop("wordOffsets")
+    localToCorpus = np.array([vocabulary.setdefault(unpackString(wordBlob, wordOffsets, i), len(vocabulary)) for i in range(len(wordOffsets) - 1)], dtype=np.int64)
+    arrays["tokenIds"] = localToCorpus[arrays["tokenIds"]] if len(arrays["tokenIds"]) else arrays["tokenIds"].astype(np.int64)
+    return arrays
+
+def refreshIndex(store):
+    manifest = readManifest(store)
+    if(manifest["segments"][:len(loadedIndex["segments"])] != loadedIndex["segments"]):
+        # The index was rebuilt, start over:
+        loadedIndex.update(segments=[], segmentData=[], vocabulary={}, documents=[], documentById={}, wordDocuments=None)
+    newSegments = manifest["segments"][len(loadedIndex["segments"]):]
+    if(len(newSegments) == 0):
+        return
+
+    words = [] if loadedIndex["wordDocuments"] is None else [loadedIndex["wordDocuments"][0]]
+    documents = [] if loadedIndex["wordDocuments"] is None else [loadedIndex["wordDocuments"][1]]
+    for segmentName in newSegments:
+        segment = loadSegment(store.get(segmentName))
+        segmentIndex = len(loadedIndex["segmentData"])
+        loadedIndex["segmentData"].append(segment)
+        loadedIndex["segments"].append(segmentName)
+        for k in range(len(segment["docSentenceOffsets"]) - 1):
+            documentId = unpackString(segment["docIdBlob"], segment["docIdOffsets"], k)
+            loadedIndex["documentById"][documentId] = len(loadedIndex["documents"])
+            loadedIndex["documents"].append((documentId, segmentIndex, k))
+            # Distinct words of the document for the document level pruning:
+            start = segment["tokenOffsets"][segment["docSentenceOffsets"][k]]
+            stop = segment["tokenOffsets"][segment["docSentenceOffsets"][k+1]]
+            documentWords = np.unique(segment["tokenIds"][start:stop])
+            words.append(documentWords)
+            documents.append(np.full(len(documentWords), len(loadedIndex["documents"]) - 1, dtype=np.int64))
+
+    # Sort the (word, document) pairs by word, so that the documents of a word are a contiguous range:
+    words = np.concatenate(words) if words else np.zeros(0, dtype=np.int64)
+    documents = np.concatenate(documents) if documents else np.zeros(0, dtype=np.int64)
+    order = np.argsort(words, kind="stable")
+    loadedIndex["wordDocuments"] = (words[order], documents[order])
+
+def getDocumentSentences(documentIndex):
+    # (sentences, encoded sentences) of an indexed document:
+    _, segmentIndex, k = loadedIndex["documents"][documentIndex]
+    segment = loadedIndex["segmentData"][segmentIndex]
+    sentences = []
+    encodedSentences = []
+    for i in range(segment["docSentenceOffsets"][k], segment["docSentenceOffsets"][k+1]):
+        sentences.append(unpackString(segment["sentenceBlob"], segment["sentenceOffsets"], i))
+        encodedSentences.append(tuple(segment["tokenIds"][segment["tokenOffsets"][i]:segment["tokenOffsets"][i+1]].tolist()))
+    return sentences, encodedSentences
+
+def encodeWithCorpusVocabulary(cleanedSentences):
+    # Words that aren't in the corpus get negative ids, so that the corpus vocabulary doesn't grow with every query:
+    vocabulary = loadedIndex["vocabulary"]
+    unknownWords = {}
+    return [
+        tuple(vocabulary[word] if word in vocabulary else unknownWords.setdefault(word, -1 - len(unknownWords)) for word in sentence.split(" "))
+        for sentence in cleanedSentences
+    ]
+
+def getTopDocuments(candSentences, topK):
+    # Score every document by the idf weighted number of distinct candidate words it contains:
+    words, documents = loadedIndex["wordDocuments"]
+    noOfDocuments = len(loadedIndex["documents"])
+    candWords = np.unique(np.array([word for sentence in candSentences for word in sentence if word >= 0], dtype=np.int64))
+    starts = np.searchsorted(words, candWords, side="left")
+    stops = np.searchsorted(words, candWords, side="right")
+    scores = np.zeros(noOfDocuments)
+    for start, stop in zip(starts, stops):
+        if(stop > start):
+            scores[documents[start:stop]] += np.log(1 + noOfDocuments / (stop - start))
+
+    # Documents replaced by a later ingest of the same id aren't reported:
+    latest = np.zeros(noOfDocuments, dtype=bool)
+    latest[list(loadedIndex["documentById"].values())] = True
+    scores[~latest] = 0
+    ranked = np.argsort(-scores, kind="stable")[:topK]
+    return [int(documentIndex) for documentIndex in ranked if scores[documentIndex] > 0]
+
+def computeCorpusSimilarity(store, candDoc, topK=defaultTopK, pruning="exact", recall=app.defaultRecall):
+    refreshIndex(store)
+    # Not through app.getPreprocessedDocument, which would add the words of every query to app.vocabulary:
+    candDocTokenised = nltk.tokenize.sent_tokenize(candDoc)
+    if(len(loadedIndex["documents"]) == 0 or len(candDocTokenised) == 0):
+        return []
+    candSentences = encodeWithCorpusVocabulary(app.cleanData(candDocTokenised))
+
+    # Compare the candidate sentence by sentence with the most promising source documents only:
+    results = []
+    for documentIndex in getTopDocuments(candSentences, topK):
+        srcDocTokenised, srcSentences = getDocumentSentences(documentIndex)
+        globalSimilarity = 0.0
+        matches = []
+        for i, (similarity, expectedMatchIndex) in enumerate(app.matchSentences(srcSentences, candSentences, pruning, recall)):
+            globalSimilarity += similarity
+            if(similarity > app.lowerThreshold):
+                matches.append({"sourceDocument": srcDocTokenised[expectedMatchIndex], "candidateDocument": candDocTokenised[i]})
+        results.append({
+            "documentId": loadedIndex["documents"][documentIndex][0],
+            "similarity": globalSimilarity / len(candSentences),
+            "matches": matches
+        })
+    results.sort(key=lambda result: -result["similarity"])
+    return results
+
+def sendSuccessResponse(body):
+    return {
+        "statusCode": 200,
+        'headers': {
+            'Access-Control-Allow-Headers' : 'Content-Type',
+            'Access-Control-Allow-Origin' : '*',
+            'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
+            'Content-Type': 'application/json'
+        },
+        "body": json.dumps(body),
+    }
+
+def ingest_lambda_handler(event, context):
+    try:
+        body = json.loads(event['body'])
+
+        # Handle error cases:
+        if("documents" not in body):
+            return app.sendErrorResponse(400, "Missing: documents field not provided")
+
+        if(not isinstance(body["documents"], list) or len(body["documents"])==0):
+            return app.sendErrorResponse(400, "documents must be a non empty list")
+
+        if(any(not isinstance(document.get("documentId"), str) or not isinstance(document.get("text"), str) for document in body["documents"])):
+            return app.sendErrorResponse(400, "Every document needs a documentId and a text")
+
+        manifest = ingestDocuments(getIndexStore(), body["documents"])
+        return sendSuccessResponse({
+            "message": "success",
+            "indexVersion": manifest["version"],
+            "noOfDocuments": manifest["noOfDocuments"]
+        })
+    except Exception as e:
+        return app.sendErrorResponse(500, str(e))
+
+def corpus_lambda_handler(event, context):
+    if(app.isWarmUpEvent(event)):
+        # Also loads the segments of the index, which the first query would otherwise download:
+        app.warmUp()
+        refreshIndex(getIndexStore())
+        return sendSuccessResponse({"message": "warm"})
+    try:
+        body = json.loads(event['body'])
+
+        # Handle error cases:
+        if("candText" not in body):
+            return app.sendErrorResponse(400, "Missing: candText field not provided")
+
+        topK = body.get("topK", defaultTopK)
+        if(not isinstance(topK, int) or topK < 1 or topK > maxTopK):
+            return app.sendErrorResponse(400, f"topK must be between 1 and {maxTopK}")
+
+        pruning = body.get("pruning", "exact")
+        if(pruning not in app.pruningModes):
+            return app.sendErrorResponse(400, "pruning must be one of exact, approximate or none")
+
+        recall = body.get("recall", app.defaultRecall)
+        if(not isinstance(recall, (int, float)) or recall <= 0 or recall > 1):
+            return app.sendErrorResponse(400, "recall must be in (0, 1]")
+
+        documents = computeCorpusSimilarity(getIndexStore(), body["candText"], topK, pruning, recall)
+        return sendSuccessResponse({
+            "message": "success",
+            "documents": documents
+        })
+    except Exception as e:
+        return app.sendErrorResponse(500, str(e))
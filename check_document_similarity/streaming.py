@@ -0,0 +1,211 @@
+import io
+import os
+import json
+import uuid
+import codecs
+import functools
+import nltk
+
+import app
+
+# Streaming mode: both documents are read from the bucket & the matches are written back to it as JSON Lines, so that
+# neither the request nor the response carries the documents. Only the source document is held in memory.
+bucket_name = os.environ.get("BUCKET_NAME", "forensic-tools-s3-bucket")
+resultPrefix = "similarity-results/"
+readChunkSize = 1 << 16         # Number of bytes read from the bucket at once
+maxSentenceChars = 1 << 16      # A longer run of text without a sentence boundary is cut into a sentence of its own
+batchSize = 512                 # Number of candidate sentences cleaned & compared at once
+partSize = 8 << 20              # Bytes of JSON Lines per uploaded part, S3 needs at least 5 MiB for every part but the last
+
+@functools.lru_cache(maxsize=None)
+def getS3():
+    # Created on first use, importing boto3 is a good part of the cold start:
+    import boto3
+    return boto3.client('s3')
+
+def readTextChunks(body):
+    # Decode incrementally, a multi byte character can be split across two chunks:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in body.iter_chunks(readChunkSize):
+        text = decoder.decode(chunk)
+        if(text):
+            yield text
+    text = decoder.decode(b"", final=True)
+    if(text):
+        yield text
+
+def iterSentences(textChunks):
+    # The last sentence of the buffer may continue in the next chunk, so it is only emitted once more text follows:
+    buffer = ""
+    for text in textChunks:
+        buffer += text
+        sentences = nltk.tokenize.sent_tokenize(buffer)
+        if(len(sentences) > 1):
+            yield from sentences[:-1]
+            buffer = buffer[buffer.rindex(sentences[-1]):]
+        while(len(buffer) > maxSentenceChars):
+            yield buffer[:maxSentenceChars]
+            buffer = buffer[maxSentenceChars:]
+    yield from nltk.tokenize.sent_tokenize(buffer)
+
+def iterBatches(sentences):
+    batch = []
+    for sentence in sentences:
+        batch.append(sentence)
+        if(len(batch) == batchSize):
+            yield batch
+            batch = []
+    if(batch):
+        yield batch
+
+def encodeCandidateBatch(cleanedSentences, vocabulary):
+    # Words that aren't in the source can't match, they get negative ids that are only valid within the batch,
+    # so that the vocabulary doesn't grow with the length of the candidate:
+    unknownWords = {}
+    return [
+        tuple(vocabulary[word] if word in vocabulary else unknownWords.setdefault(word, -1 - len(unknownWords)) for word in sentence.split(" "))
+        for sentence in cleanedSentences
+    ]
+
+class JSONLinesWriter:
+    # Writes JSON Lines to one object of the bucket with a multipart upload, a page of partSize bytes at a time:
+    def __init__(self, bucketName, key):
+        self.bucketName = bucketName
+        self.key = key
+        self.buffer = io.BytesIO()
+        self.uploadId = None
+        self.parts = []
+
+    def write(self, record):
+        self.buffer.write(json.dumps(record).encode("utf-8") + b"\n")
+        if(self.buffer.tell() >= partSize):
+            self.flushPart()
+
+    def flushPart(self):
+        if(self.uploadId is None):
+            self.uploadId = getS3().create_multipart_upload(Bucket=self.bucketName, Key=self.key, ContentType="application/x-ndjson")['UploadId']
+        partNumber = len(self.parts) + 1
+        response = getS3().upload_part(Bucket=self.bucketName, Key=self.key, UploadId=self.uploadId, PartNumber=partNumber, Body=self.buffer.getvalue())
+        self.parts.append({"ETag": response['ETag'], "PartNumber": partNumber})
+        self.buffer = io.BytesIO()
+
+    def close(self):
+        # A result that fits in one page is written with a single put:
+        if(self.uploadId is None):
+            getS3().put_object(Bucket=self.bucketName, Key=self.key, Body=self.buffer.getvalue(), ContentType="application/x-ndjson")
+            return
+        if(self.buffer.tell() > 0):
+            self.flushPart()
+        getS3().complete_multipart_upload(Bucket=self.bucketName, Key=self.key, UploadId=self.uploadId, MultipartUpload={"Parts": self.parts})
+
+    def abort(self):
+        if(self.uploadId is not None):
+            getS3().abort_multipart_upload(Bucket=self.bucketName, Key=self.key, UploadId=self.uploadId)
+
+def getObjectBody(key):
+    return getS3().get_object(Bucket=bucket_name, Key=key)['Body']
+
+def loadSourceDocument(key):
+    # The source is compared with every candidate sentence, so it is kept in memory, encoded with a vocabulary of its own:
+    vocabulary = {}
+    srcSentences = []
+    srcEncoded = []
+    for batch in iterBatches(iterSentences(readTextChunks(getObjectBody(key)))):
+        srcSentences.extend(batch)
+        srcEncoded.extend(app.encodeSentences(app.cleanData(batch), vocabulary))
+    return srcSentences, srcEncoded, vocabulary
+
+def computeStreamingSimilarity(srcKey, candKey, resultKey, pruning="exact", recall=app.defaultRecall):
+    srcSentences, srcEncoded, vocabulary = loadSourceDocument(srcKey)
+    if(len(srcSentences) == 0):
+        raise ValueError("The source document is empty")
+
+    # Only one batch of candidate sentences & one page of matches are held in memory at a time:
+    writer = JSONLinesWriter(bucket_name, resultKey)
+    globalSimilarity = 0.0
+    noOfCandSentences = 0
+    noOfMatches = 0
+    # The source index is built & the workers are forked for the first batch, then reused by every following one:
+    workers = None
+    try:
+        for batch in iterBatches(iterSentences(readTextChunks(getObjectBody(candKey)))):
+            candEncoded = encodeCandidateBatch(app.cleanData(batch), vocabulary)
+            if(workers is None):
+                workers = app.MatchingWorkers(srcEncoded, pruning, recall, app.getNoOfWorkers(len(srcEncoded) * len(candEncoded)))
+            bestMatches = workers.match(candEncoded)
+            for i, (similarity, expectedMatchIndex) in enumerate(bestMatches):
+                globalSimilarity += similarity
+                if(similarity > app.lowerThreshold):
+                    writer.write({
+                        "candidateIndex": noOfCandSentences + i,
+                        "sourceIndex": expectedMatchIndex,
+                        "similarity": similarity,
+                        "sourceDocument": srcSentences[expectedMatchIndex],
+                        "candidateDocument": batch[i]
+                    })
+                    noOfMatches += 1
+            noOfCandSentences += len(batch)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        if(workers is not None):
+            workers.close()
+
+    if(noOfCandSentences == 0):
+        raise ValueError("The candidate document is empty")
+    return {
+        "similarity": globalSimilarity / noOfCandSentences,
+        "noOfSourceSentences": len(srcSentences),
+        "noOfCandidateSentences": noOfCandSentences,
+        "noOfMatches": noOfMatches
+    }
+
+def stream_lambda_handler(event, context):
+    if(app.isWarmUpEvent(event)):
+        app.warmUp()
+        getS3()
+        return {"statusCode": 200, "body": json.dumps({"message": "warm"})}
+    try:
+        body = json.loads(event['body'])
+
+        # Handle error cases:
+        if("srcFileName" not in body):
+            return app.sendErrorResponse(400, "Missing: srcFileName field not provided")
+
+        if("candFileName" not in body):
+            return app.sendErrorResponse(400, "Missing: candFileName field not provided")
+
+        pruning = body.get("pruning", "exact")
+        if(pruning not in app.pruningModes):
+            return app.sendErrorResponse(400, "pruning must be one of exact, approximate or none")
+
+        recall = body.get("recall", app.defaultRecall)
+        if(not isinstance(recall, (int, float)) or recall <= 0 or recall > 1):
+            return app.sendErrorResponse(400, "recall must be in (0, 1]")
+
+        resultKey = resultPrefix + uuid.uuid4().hex + ".jsonl"
+        summary = computeStreamingSimilarity(body["srcFileName"], body["candFileName"], resultKey, pruning, recall)
+
+        return {
+            "statusCode": 200,
+            'headers': {
+                'Access-Control-Allow-Headers' : 'Content-Type',
+                'Access-Control-Allow-Origin' : '*',
+                'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
+                'Content-Type': 'application/json'
+            },
+            "body": json.dumps(
+                {
+                    "message": "success",
+                    **summary,
+                    "resultKey": resultKey,
+                    "resultUrl": f'https://{bucket_name}.s3.amazonaws.com/{resultKey}'
+                }
+            ),
+        }
+    except ValueError as e:
+        return app.sendErrorResponse(400, str(e))
+    except Exception as e:
+        return app.sendErrorResponse(500, str(e))
@@ -1,10 +1,18 @@
+import os
 import json
+import time
+import shutil
+import tempfile
 import numpy as np
-import boto3
-import os
 import cv2
-import base64
-from scipy.fftpack import dct, idct
+import storage
+import resultcache
+import inline
+import warmup
+import batch
+import keyschedule
+import encoders
+import frames
 
 #Internal Parameters: Don't change without understanding the code as it may cause hazards
 H = 1024        # Host image is resized to this internally for embedding
@@ -13,9 +21,7 @@ N = 8           # This denotes that we are forming 8x8 sub-blocks
 fact = 16       # To cope up with np.uint8 of idct
 DCT_ROW = 2     # Row where waterMark is stored in 8x8 dct transform of the image
 DCT_COL = 2     # Col where waterMark is stored in 8x8 dct transform of the image
-
-s3 = boto3.resource('s3')
-bucket_name = "forensic-tools-s3-bucket"
+modes = ("resized", "native")   # The host is resized to HxH around the embedding, or the blocks are taken from the host as it is
 
 def sendErrorResponse(statusCode, errMessage):
     return {
@@ -33,19 +39,17 @@ def sendErrorResponse(statusCode, errMessage):
         ),
     }
 
-def s3_to_cv2(fileName):
-    object = s3.Object(bucket_name, fileName)
-    image_content = object.get()['Body'].read()
-    nparr = np.frombuffer(image_content, np.uint8)
-    srcImage = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
-    return srcImage
-
-def cv2_to_s3Url(image, format, fileName):
-    image = cv2.imencode(format, image)[1].tobytes()
-    responseFileName = os.path.splitext(fileName)[0] + format
-    s3.Bucket(bucket_name).put_object(Key=responseFileName, Body=image)
-    responseUrl = f'https://{bucket_name}.s3.amazonaws.com/{responseFileName}'
-    return responseUrl
+def sendSuccessResponse(body):
+    return {
+        "statusCode": 200,
+        'headers': {
+            'Access-Control-Allow-Headers' : 'Content-Type',
+            'Access-Control-Allow-Origin' : '*',
+            'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
+            'Content-Type': 'application/json'
+        },
+        "body": json.dumps(body),
+    }
 
 def binariseImageData (image):
     # Watermark is stored in grayscale
@@ -54,64 +58,92 @@ def binariseImageData (image):
     th , waterMarkImageBinary = cv2.threshold(image, 128, 255, cv2.THRESH_BINARY)
     return waterMarkImageBinary
 
-# This idea is motivated by RC4 algorithm to generate randomised permuted array from secret key
-def getPermutedArray(secretKey, n):
-    S = [i for i in range(n)] 
-    T = [0 for i in range(n)]
-    for i in range(n):
-        T[i] += ord(secretKey[i%len(secretKey)])
-        T[i] %= n
-    j = 0
-    for i in range(n):
-        j = (j + S[i] + T[i])%n
-        # swapping S[i] & S[j]
-        temp = S[i]
-        S[i] = S[j]
-        S[j] = temp
-    return S
+def getDCTBasis(n):
+    # Orthonormal DCT-II matrix, so that dct(dct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho') == C @ BLOCK @ C.T
+    k = np.arange(n).reshape(-1, 1)
+    x = np.arange(n).reshape(1, -1)
+    C = np.sqrt(2.0 / n) * np.cos(np.pi * (2*x + 1) * k / (2*n))
+    C[0] /= np.sqrt(2.0)
+    return C
 
-def embedWaterMarkInHostImage(hostImage, waterMarkImage, secretKey):
+# The dct is linear, so changing only the [DCT_ROW][DCT_COL] coefficient of a block by d adds d times this 8x8 pattern to its pixels:
+dctBasis = getDCTBasis(N)
+coefficientPattern = np.outer(dctBasis[DCT_ROW], dctBasis[DCT_COL])
 
-    if len(hostImage.shape) == 2:
-        hostImage = cv2.cvtColor(hostImage, cv2.COLOR_GRAY2BGR)
+def getBlockView(image):
+    # View the image as a (H/N, H/N, N, N) tensor where [i][j] is the NxN block at block row i & block col j:
+    return image.reshape(image.shape[0] // N, N, image.shape[1] // N, N).swapaxes(1, 2)
+
+def getPermutedBlocks(secretKey, count):
+    # The blocks are visited in the order of the nested loops "for i in permutedArray: for j in permutedArray":
+    numBlocksIn1Dim = H // N
+    permutedArray = keyschedule.getPermutation(secretKey, numBlocksIn1Dim)
+    position = np.arange(count)
+    return permutedArray[position // numBlocksIn1Dim], permutedArray[position % numBlocksIn1Dim]
+
+def getNativeBlocks(secretKey, shape):
+    # (block rows, block cols) of the W*W blocks of the native mode, None when the image has less than W blocks in a dimension.
+    # A grid of WxW tiles covers the image & every tile holds one bit, so that the bits are spread over the whole image:
+    # bit b goes to tile tiles[b], the block within the tile is picked by the key as well.
+    tileBlockRows, tileBlockCols = shape[0] // (N*W), shape[1] // (N*W)
+    if(tileBlockRows == 0 or tileBlockCols == 0):
+        return None
+    tiles = keyschedule.getPermutation(secretKey, W*W)
+    rowOffsets = keyschedule.getPermutation(secretKey, tileBlockRows)[tiles % tileBlockRows]
+    colOffsets = keyschedule.getPermutation(secretKey, tileBlockCols)[(tiles // tileBlockRows) % tileBlockCols]
+    return (tiles // W) * tileBlockRows + rowOffsets, (tiles % W) * tileBlockCols + colOffsets
+
+def getNativeBlockView(image):
+    # View of the whole NxN blocks of an image of any size as (rows, cols, N, N[, channels]), writes go through to the image:
+    noOfRows, noOfCols = image.shape[0] // N, image.shape[1] // N
+    return image[:noOfRows*N, :noOfCols*N].reshape(noOfRows, N, noOfCols, N, *image.shape[2:]).swapaxes(1, 2)
+
+def getWaterMarkDelta(waterMarkImage):
+    # (W*W, N, N) change of the pixels of the blocks, the [DCT_ROW][DCT_COL] coefficient goes up by fact for a 0 bit & down for a 1 bit:
     if len(waterMarkImage.shape) == 2:
         waterMarkImage = cv2.cvtColor(waterMarkImage, cv2.COLOR_GRAY2BGR)
+    waterMarkImageBinary = binariseImageData(waterMarkImage).reshape(-1)
+    change = np.where(waterMarkImageBinary[:W*W]==0, fact, -fact)
+    return change.reshape(-1, 1, 1) * coefficientPattern
+
+def addDeltaNative(hostImage, blocks, delta):
+    # Y = 0.299R + 0.587G + 0.114B, so adding the pattern to B, G & R changes Y by the pattern & leaves U & V as they are.
+    # Pixels outside the blocks are unchanged, the blocks are written in place:
+    maxValue = np.iinfo(hostImage.dtype).max
+    if(maxValue != 255):
+        # The change is scaled to the range of the samples, e.g. for 16 bit images:
+        delta = delta * (maxValue / 255)
+    blockView = getNativeBlockView(hostImage)
+    blockPixels = blockView[blocks].astype(np.float64)
+    if(hostImage.ndim == 3):
+        # Alpha, if any, is left as it is:
+        blockPixels[..., :3] += delta[..., None]
+    else:
+        blockPixels += delta
+    blockView[blocks] = np.clip(np.rint(blockPixels), 0, maxValue).astype(hostImage.dtype)
+    return hostImage
+
+def embedWaterMarkNative(hostImage, waterMarkImage, secretKey):
+    # Changes the same coefficient as embedWaterMarkInHostImage, in blocks of the host at its own size, so neither the
+    # resize round trip nor a YUV conversion of the whole image is needed. Returns None when the host is too small:
+    blocks = getNativeBlocks(secretKey, hostImage.shape)
+    if(blocks is None):
+        return None
+    return addDeltaNative(hostImage, blocks, getWaterMarkDelta(waterMarkImage))
+
+def addDeltaResized(hostImage, blocks, delta):
+    if len(hostImage.shape) == 2:
+        hostImage = cv2.cvtColor(hostImage, cv2.COLOR_GRAY2BGR)
 
     # Convert to YUV format from BGR format (we will store information in Y channel denoting luminance):
     hostOriginalDim = (hostImage.shape[1], hostImage.shape[0])
     hostImage = cv2.resize(hostImage, (H, H), interpolation=cv2.INTER_CUBIC)
     hostImageY, hostImageU, hostImageV = cv2.split(cv2.cvtColor(hostImage, cv2.COLOR_BGR2YUV))
 
-    # Get the data to embed in binary format:
-    waterMarkImageBinary = binariseImageData(waterMarkImage)
-    waterMarkImageBinary = waterMarkImageBinary.reshape(-1) # Converts to 1D array
-    
-
-    lengthofBinaryString = W*W
-    # Do the watermarking:
-    numBlocksIn1Dim = H // N
-    permutedArray = getPermutedArray(secretKey, numBlocksIn1Dim)
-    index = 0
-    shouldBreak = False
-    
-    for i in permutedArray:
-        for j in permutedArray:
-            BLOCK = hostImageY[8*i:8*i+N, 8*j:8*j+N]
-            BLOCK = dct(dct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho')
-            data = BLOCK[2][2]
-            if(waterMarkImageBinary[index]==0):
-                data += fact
-            else:
-                data -= fact
-            BLOCK[2][2] = data
-            BLOCK = idct(idct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho')
-            hostImageY[8*i:8*i+N, 8*j:8*j+N] = BLOCK
-            index += 1
-            if(index==lengthofBinaryString):
-                shouldBreak = True
-                break
-        if(shouldBreak):
-            break
+    # Do the watermarking on all the key permuted blocks at once (in float, so that nothing is truncated per block):
+    hostImageYFloat = hostImageY.astype(np.float64)
+    getBlockView(hostImageYFloat)[blocks] += delta
+    hostImageY = np.clip(np.rint(hostImageYFloat), 0, 255).astype(np.uint8)
 
     # Combine to get watermarkEmbedded image
     hostImage = cv2.merge((hostImageY, hostImageU, hostImageV))
@@ -120,45 +152,198 @@ def embedWaterMarkInHostImage(hostImage, waterMarkImage, secretKey):
 
     return hostImage
 
+def embedWaterMarkInHostImage(hostImage, waterMarkImage, secretKey):
+    # The key permuted blocks of the host resized to HxH:
+    return addDeltaResized(hostImage, getPermutedBlocks(secretKey, W*W), getWaterMarkDelta(waterMarkImage))
+
+
+def getFrameEmbedder(mode, waterMarkImage, secretKey, frameShape):
+    # The blocks of the key & the change of their pixels are the same for every frame of a video, so they are computed once
+    # & every frame only gets the change added. None when the frames are too small for the native mode:
+    delta = getWaterMarkDelta(waterMarkImage)
+    if(mode == "native"):
+        blocks = getNativeBlocks(secretKey, frameShape)
+        if(blocks is None):
+            return None
+        return lambda frame: addDeltaNative(frame, blocks, delta)
+    blocks = getPermutedBlocks(secretKey, W*W)
+    return lambda frame: addDeltaResized(frame, blocks, delta)
+
+def warmUp():
+    # One time initialisation, see warmup.py:
+    storage.warmUp()
+    inline.warmUp()
 
 def lambda_handler(event, context):
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
     try:
-        body = json.loads(event['body'])
+        body, binaryImage = inline.parseRequest(event)
 
-        # Handle error cases:
-        if("hostImageFileName" not in body):
+        # Handle error cases, every image is either in the bucket or inline (the host image can also be the binary body):
+        isInlineHost = binaryImage is not None or "hostImageBase64" in body
+        if("hostImageFileName" not in body and not isInlineHost):
             return sendErrorResponse(400, "Missing: hostImageFileName field not provided")
 
-        if("waterMarkImageFileName" not in body):
+        if("waterMarkImageFileName" not in body and "waterMarkImageBase64" not in body):
             return sendErrorResponse(400, "Missing: waterMarkImageFileName field not provided")
+
+        outputMode = inline.getOutputMode(body, isInlineHost)
+        if(outputMode not in inline.outputModes):
+            return sendErrorResponse(400, "output must be one of s3, inline or auto")
+
+        encoding, errorMessage = encoders.getEncoding(body, lossless=False)
+        if(encoding is None):
+            return sendErrorResponse(400, errorMessage)
         
         if("secretKey" not in body):
             return sendErrorResponse(400, "Missing: secretKey field not provided")
 
         if(len(body["secretKey"])==0):
             return sendErrorResponse(400, "Secret Key can't be empty")
+
+        mode = body.get("mode", "resized")
+        if(mode not in modes):
+            return sendErrorResponse(400, "mode must be either resized or native")
         
-        hostImage = s3_to_cv2(body["hostImageFileName"])
-        waterMarkImage = s3_to_cv2(body["waterMarkImageFileName"])
+        # A repeated request returns the image written for the first one:
+        imageFields = [("hostImageFileName", "hostImageBase64"), ("waterMarkImageFileName", "waterMarkImageBase64")]
+        parameters = {"H": H, "W": W, "N": N, "fact": fact, "DCT_ROW": DCT_ROW, "DCT_COL": DCT_COL, "encoding": encoding, "mode": mode}
+        cacheEntry = None
+        if(binaryImage is None and not any(base64Field in body for _, base64Field in imageFields) and outputMode == "s3"):
+            cacheEntry = resultcache.getCacheEntry("embed", [body[fileNameField] for fileNameField, _ in imageFields], body["secretKey"], None, parameters)
+        response = resultcache.lookup(cacheEntry)
+        if(response is not None):
+            storage.finishRequest()
+            return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry, True)})
+
+        hostImage, waterMarkImage = inline.getImages(body, binaryImage, imageFields)
         secretKey = body["secretKey"]
         
-        imageWithWaterMark = embedWaterMarkInHostImage(hostImage, waterMarkImage, secretKey)
-        imageWithWaterMarkUrl = cv2_to_s3Url(imageWithWaterMark, '.jpg', body["hostImageFileName"])
-
-        return {
-            "statusCode": 200,
-            'headers': {
-                'Access-Control-Allow-Headers' : 'Content-Type',
-                'Access-Control-Allow-Origin' : '*',
-                'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
-                'Content-Type': 'application/json'
-            },
-            "body": json.dumps(
-                {
-                    "message": "success",
-                    "imageWithWaterMarkUrl": imageWithWaterMarkUrl
-                }
-            ),
+        if(mode == "native"):
+            imageWithWaterMark = embedWaterMarkNative(hostImage, waterMarkImage, secretKey)
+        else:
+            imageWithWaterMark = embedWaterMarkInHostImage(hostImage, waterMarkImage, secretKey)
+        if(imageWithWaterMark is None):
+            storage.finishRequest()
+            return sendErrorResponse(400, f"The native mode needs a host image of at least {N*W}x{N*W} pixels")
+        response = {"message": "success"}
+        responseFileName = inline.putImage(response, "imageWithWaterMark", imageWithWaterMark, encoding, body.get("hostImageFileName"), outputMode)
+        resultcache.store(cacheEntry, response, [responseFileName])
+        storage.finishRequest()
+        return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry)})
+    except Exception as e:
+        storage.finishRequest(raiseErrors=False)
+        return sendErrorResponse(500, str(e))
+
+def batch_lambda_handler(event, context):
+    # {"items": [...], ...}, every item is a request to lambda_handler, see batch.py:
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
+    return batch.handleBatch(event, context, lambda_handler, sendSuccessResponse, sendErrorResponse)
+
+def video_lambda_handler(event, context):
+    # Embeds the watermark in every frame of a video in the bucket & uploads the watermarked video, see frames.py:
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
+    tempDir = None
+    try:
+        body = json.loads(event['body'])
+
+        # Handle error cases:
+        if("videoFileName" not in body):
+            return sendErrorResponse(400, "Missing: videoFileName field not provided")
+
+        if("waterMarkImageFileName" not in body and "waterMarkImageBase64" not in body):
+            return sendErrorResponse(400, "Missing: waterMarkImageFileName field not provided")
+
+        if("secretKey" not in body):
+            return sendErrorResponse(400, "Missing: secretKey field not provided")
+
+        if(len(body["secretKey"])==0):
+            return sendErrorResponse(400, "Secret Key can't be empty")
+
+        mode = body.get("mode", "resized")
+        if(mode not in modes):
+            return sendErrorResponse(400, "mode must be either resized or native")
+
+        codec = body.get("codec", "mp4v")
+        if(codec not in frames.codecs):
+            return sendErrorResponse(400, f"codec must be one of {', '.join(frames.codecs)}")
+
+        # The video is downloaded to /tmp while the watermark image is fetched:
+        videoFileName = body["videoFileName"]
+        tempDir = tempfile.mkdtemp()
+        inputPath = os.path.join(tempDir, "input" + os.path.splitext(videoFileName)[1])
+        download = storage.submit(storage.downloadFile, videoFileName, inputPath)
+        waterMarkImage, = inline.getImages(body, None, [("waterMarkImageFileName", "waterMarkImageBase64")])
+        download.result()
+        secretKey = body["secretKey"]
+
+        capture = frames.openVideo(inputPath)
+        if(capture is None):
+            storage.finishRequest()
+            return sendErrorResponse(400, "The video could not be decoded")
+        try:
+            info = frames.getVideoInfo(capture)
+            if(info["noOfFrames"] > frames.maxFrames):
+                storage.finishRequest()
+                return sendErrorResponse(400, f"The video can have at most {frames.maxFrames} frames")
+
+            embedFrame = getFrameEmbedder(mode, waterMarkImage, secretKey, (info["height"], info["width"], 3))
+            if(embedFrame is None):
+                storage.finishRequest()
+                return sendErrorResponse(400, f"The native mode needs a video of at least {N*W}x{N*W} pixels")
+
+            fourcc, extension, contentType = frames.codecs[codec]
+            outputPath = os.path.join(tempDir, "output" + extension)
+            writer = frames.openWriter(outputPath, codec, info["fps"], info["width"], info["height"])
+            if(writer is None):
+                storage.finishRequest()
+                return sendErrorResponse(500, f"The {codec} codec is not available")
+            try:
+                start = time.perf_counter()
+                readState = {"truncated": False}
+                noOfFrames = frames.processFrames(frames.readFrames(capture, 1, readState), embedFrame, writer.write)
+                seconds = time.perf_counter() - start
+            finally:
+                writer.release()
+        finally:
+            capture.release()
+
+        # The frames past the limit weren't watermarked, so the output isn't uploaded:
+        if(readState["truncated"]):
+            storage.finishRequest()
+            return sendErrorResponse(400, f"The video can have at most {frames.maxFrames} frames")
+
+        if(noOfFrames == 0):
+            storage.finishRequest()
+            return sendErrorResponse(400, "The video has no frames")
+
+        outputFileName = os.path.splitext(videoFileName)[0] + "_watermarked" + extension
+        response = {
+            "message": "success",
+            "videoWithWaterMarkUrl": storage.uploadFile(outputPath, outputFileName, contentType),
+            "noOfFrames": noOfFrames,
+            "framesPerSecond": round(noOfFrames / seconds, 2),
+            "videoFps": info["fps"],
+            "width": info["width"],
+            "height": info["height"],
+            "codec": codec
         }
+        storage.finishRequest()
+        return sendSuccessResponse(response)
     except Exception as e:
+        storage.finishRequest(raiseErrors=False)
         return sendErrorResponse(500, str(e))
+    finally:
+        # /tmp is kept between the invocations of a warm container:
+        if(tempDir is not None):
+            shutil.rmtree(tempDir, ignore_errors=True)
+
+# With provisioned concurrency the init phase runs ahead of the requests:
+if(warmup.warmUpOnInit):
+    warmUp()
@@ -2,9 +2,17 @@ import json
 import numpy as np
 import cv2
 import os
-import base64
-import boto3
-from scipy.fftpack import dct
+import time
+import shutil
+import tempfile
+import storage
+import resultcache
+import inline
+import warmup
+import batch
+import keyschedule
+import encoders
+import frames
 
 #Internal Parameters: Don't change without understanding the code as it may cause hazards
 H = 1024        # Host image is resized to this internally for embedding
@@ -13,9 +21,10 @@ N = 8           # This denotes that we are forming 8x8 sub-blocks
 fact = 16       # To cope up with np.uint8 of idct
 DCT_ROW = 2     # Row where waterMark is stored in 8x8 dct transform of the image
 DCT_COL = 2     # Col where waterMark is stored in 8x8 dct transform of the image
-
-s3 = boto3.resource('s3')
-bucket_name = "forensic-tools-s3-bucket"
+zeroTolerance = 1e-9    # Coefficients this close to 0 are treated as 0
+maxNoOfKeys = 1000      # Maximum number of keys that can be verified in one request
+modes = ("resized", "native")   # The mode the watermark was embedded with, see embed_watermark
+lumaWeights = np.array([0.114, 0.587, 0.299])   # Y of BGR, the same as cv2.COLOR_BGR2YUV
 
 def sendErrorResponse(statusCode, errMessage):
     return {
@@ -33,83 +42,187 @@ def sendErrorResponse(statusCode, errMessage):
         ),
     }
 
-def s3_to_cv2(fileName):
-    object = s3.Object(bucket_name, fileName)
-    image_content = object.get()['Body'].read()
-    nparr = np.frombuffer(image_content, np.uint8)
-    srcImage = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
-    return srcImage
-
-def cv2_to_s3Url(image, format, fileName):
-    image = cv2.imencode(format, image)[1].tobytes()
-    responseFileName = os.path.splitext(fileName)[0] + format
-    s3.Bucket(bucket_name).put_object(Key=responseFileName, Body=image)
-    responseUrl = f'https://{bucket_name}.s3.amazonaws.com/{responseFileName}'
-    return responseUrl
-
-# This idea is motivated by RC4 algorithm to generate randomised permuted array from secret key
-def getPermutedArray(secretKey, n):
-    S = [i for i in range(n)] 
-    T = [0 for i in range(n)]
-    for i in range(n):
-        T[i] += ord(secretKey[i%len(secretKey)])
-        T[i] %= n
-    j = 0
-    for i in range(n):
-        j = (j + S[i] + T[i])%n
-        # swapping S[i] & S[j]
-        temp = S[i]
-        S[i] = S[j]
-        S[j] = temp
-    return S
+def sendSuccessResponse(body):
+    return {
+        "statusCode": 200,
+        'headers': {
+            'Access-Control-Allow-Headers' : 'Content-Type',
+            'Access-Control-Allow-Origin' : '*',
+            'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
+            'Content-Type': 'application/json'
+        },
+        "body": json.dumps(body),
+    }
 
-def extractWaterMarkImage(imageEmbeddedWithWaterMark, secretKey):
+def binariseImageData (image):
+    # Watermark is stored in grayscale
+    if len(image.shape) == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = cv2.resize(image, (W, W), interpolation=cv2.INTER_CUBIC)     # This is resizing to W dim
+    th , waterMarkImageBinary = cv2.threshold(image, 128, 255, cv2.THRESH_BINARY)
+    return waterMarkImageBinary
+
+def getDCTBasis(n):
+    # Orthonormal DCT-II matrix, so that dct(dct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho') == C @ BLOCK @ C.T
+    k = np.arange(n).reshape(-1, 1)
+    x = np.arange(n).reshape(1, -1)
+    C = np.sqrt(2.0 / n) * np.cos(np.pi * (2*x + 1) * k / (2*n))
+    C[0] /= np.sqrt(2.0)
+    return C
 
-    # Get the data:
+# The [DCT_ROW][DCT_COL] coefficient of a block is the sum of its pixels weighted by this 8x8 mask:
+dctBasis = getDCTBasis(N)
+coefficientPattern = np.outer(dctBasis[DCT_ROW], dctBasis[DCT_COL])
+
+def getBlockView(image):
+    # View the image as a (H/N, H/N, N, N) tensor where [i][j] is the NxN block at block row i & block col j:
+    return image.reshape(image.shape[0] // N, N, image.shape[1] // N, N).swapaxes(1, 2)
+
+def getPermutedBlocks(secretKey, count):
+    # The blocks are visited in the order of the nested loops "for i in permutedArray: for j in permutedArray":
+    numBlocksIn1Dim = H // N
+    permutedArray = keyschedule.getPermutation(secretKey, numBlocksIn1Dim)
+    position = np.arange(count)
+    return permutedArray[position // numBlocksIn1Dim], permutedArray[position % numBlocksIn1Dim]
+
+def getCoefficientMap(imageEmbeddedWithWaterMark):
+    # Get the luminance data:
     if len(imageEmbeddedWithWaterMark.shape) == 2:
         imageEmbeddedWithWaterMark = cv2.cvtColor(imageEmbeddedWithWaterMark, cv2.COLOR_GRAY2BGR)
     imageEmbeddedWithWaterMark = cv2.resize(imageEmbeddedWithWaterMark, (H, H), interpolation=cv2.INTER_CUBIC)
     imageEmbeddedWithWaterMarkY, _, _ = cv2.split(cv2.cvtColor(imageEmbeddedWithWaterMark, cv2.COLOR_BGR2YUV))
 
-    waterMarkImageBinary = ""
-    index = 0
-    shouldBreak = False
-    lengthofBinaryString = W*W
-    numBlocksIn1Dim = H // N
-    permutedArray = getPermutedArray(secretKey, numBlocksIn1Dim)
-
-    # Extract the data:
-    for i in permutedArray:
-        for j in permutedArray:
-            BLOCK = imageEmbeddedWithWaterMarkY[8*i:8*i+N, 8*j:8*j+N]
-            # Take DCT:
-            BLOCK = dct(dct(BLOCK, axis=0, norm='ortho'), axis=1, norm='ortho')
-            data = BLOCK[2][2]
-            if(data >= 0):
-                waterMarkImageBinary += '0'
-            else:
-                waterMarkImageBinary += '1'
-            index += 1
-            if(index==lengthofBinaryString):
-                shouldBreak = True
-                break
-        if(shouldBreak):
-            break
-
-   #Save the extracted watermark back:
-    waterMarkImageExtracted = [int(waterMarkImageBinary[i])*255 for i in range(0, len(waterMarkImageBinary))]
-    waterMarkImageExtracted = np.uint8(waterMarkImageExtracted).reshape((W, W))
-
-    return waterMarkImageExtracted
+    # [DCT_ROW][DCT_COL] coefficient of every block in one contraction:
+    blocks = getBlockView(imageEmbeddedWithWaterMarkY.astype(np.float64))
+    return np.einsum('ijkl,kl->ij', blocks, coefficientPattern)
+
+def extractFromCoefficientMap(coefficientMap, secretKey):
+    return readWaterMark(coefficientMap[getPermutedBlocks(secretKey, W*W)])
+
+def getNativeBlocks(secretKey, shape):
+    # (block rows, block cols) of the W*W blocks of the native mode, None when the image has less than W blocks in a dimension.
+    # A grid of WxW tiles covers the image & every tile holds one bit, so that the bits are spread over the whole image:
+    # bit b goes to tile tiles[b], the block within the tile is picked by the key as well.
+    tileBlockRows, tileBlockCols = shape[0] // (N*W), shape[1] // (N*W)
+    if(tileBlockRows == 0 or tileBlockCols == 0):
+        return None
+    tiles = keyschedule.getPermutation(secretKey, W*W)
+    rowOffsets = keyschedule.getPermutation(secretKey, tileBlockRows)[tiles % tileBlockRows]
+    colOffsets = keyschedule.getPermutation(secretKey, tileBlockCols)[(tiles // tileBlockRows) % tileBlockCols]
+    return (tiles // W) * tileBlockRows + rowOffsets, (tiles % W) * tileBlockCols + colOffsets
+
+def getNativeBlockView(image):
+    # View of the whole NxN blocks of an image of any size as (rows, cols, N, N[, channels]), writes go through to the image:
+    noOfRows, noOfCols = image.shape[0] // N, image.shape[1] // N
+    return image[:noOfRows*N, :noOfCols*N].reshape(noOfRows, N, noOfCols, N, *image.shape[2:]).swapaxes(1, 2)
+
+def readWaterMark(coefficients):
+    # A non negative coefficient denotes 0 and a negative one denotes 1
+    # (flat blocks have a coefficient of 0 which may come out as -1e-15 from the contraction):
+    return np.where(coefficients >= -zeroTolerance, 0, 255).astype(np.uint8).reshape((W, W))
+
+def getNativeCoefficients(imageEmbeddedWithWaterMark, blocks):
+    # Only the luma of the given blocks is computed, at the size of the image:
+    blockPixels = getNativeBlockView(imageEmbeddedWithWaterMark)[blocks].astype(np.float64)
+    if(blockPixels.ndim == 4):
+        # The coefficient of the luma in one product, with the weights of B, G & R folded into the pattern:
+        blockPixels = blockPixels[..., :3]
+        pattern = coefficientPattern[..., None] * lumaWeights
+    else:
+        pattern = coefficientPattern
+    return blockPixels.reshape(len(blockPixels), -1) @ pattern.reshape(-1)
+
+def extractWaterMarkNative(imageEmbeddedWithWaterMark, secretKey):
+    # Reads back embedWaterMarkNative, returns None when the image is too small:
+    blocks = getNativeBlocks(secretKey, imageEmbeddedWithWaterMark.shape)
+    if(blocks is None):
+        return None
+    return readWaterMark(getNativeCoefficients(imageEmbeddedWithWaterMark, blocks))
+
+def extractWaterMarkImage(imageEmbeddedWithWaterMark, secretKey):
+
+    coefficientMap = getCoefficientMap(imageEmbeddedWithWaterMark)
+    return extractFromCoefficientMap(coefficientMap, secretKey)
+
+def getSpatialCoherence(waterMarkImage):
+    # Fraction of neighbouring pixels with the same value, a wrong key reads close to random bits (~0.5) while a real watermark is mostly smooth:
+    horizontal = waterMarkImage[:, 1:] == waterMarkImage[:, :-1]
+    vertical = waterMarkImage[1:, :] == waterMarkImage[:-1, :]
+    return float((horizontal.sum() + vertical.sum()) / (horizontal.size + vertical.size))
+
+def isBetterScore(score, bestScore):
+    if("bitErrorRate" in score):
+        return score["bitErrorRate"] < bestScore["bitErrorRate"]
+    return score["spatialCoherence"] > bestScore["spatialCoherence"]
+
+def verifyWaterMarkKeys(imageEmbeddedWithWaterMark, secretKeys, referenceWaterMark=None, mode="resized"):
+    # In the resized mode the coefficients don't depend on the key, so they are computed once and every key only reorders them.
+    # In the native mode every key reads its own blocks:
+    if(mode == "resized"):
+        coefficientMap = getCoefficientMap(imageEmbeddedWithWaterMark)
+    if(referenceWaterMark is not None):
+        referenceWaterMark = binariseImageData(referenceWaterMark)
+
+    scores = []
+    bestIndex = -1
+    bestWaterMark = None
+    for index, secretKey in enumerate(secretKeys):
+        if(mode == "resized"):
+            extractedWaterMark = extractFromCoefficientMap(coefficientMap, secretKey)
+        else:
+            extractedWaterMark = extractWaterMarkNative(imageEmbeddedWithWaterMark, secretKey)
+        score = {
+            "keyIndex": index,
+            "spatialCoherence": getSpatialCoherence(extractedWaterMark)
+        }
+        if(referenceWaterMark is not None):
+            score["bitErrorRate"] = float(np.count_nonzero(extractedWaterMark != referenceWaterMark) / extractedWaterMark.size)
+
+        # Best match is the lowest bit error rate when a reference is given, otherwise the most coherent watermark:
+        if(bestIndex == -1 or isBetterScore(score, scores[bestIndex])):
+            bestIndex = index
+            bestWaterMark = extractedWaterMark
+        scores.append(score)
+
+    return scores, bestIndex, bestWaterMark
+
+def getFrameExtractor(mode, secretKey, frameShape):
+    # The blocks of the key are the same for every frame of a video, so they are computed once & every frame only
+    # gets its coefficients read. The extractor returns the 1 bits of the frame, None when the frames are too small:
+    if(mode == "native"):
+        blocks = getNativeBlocks(secretKey, frameShape)
+        if(blocks is None):
+            return None
+        return lambda frame: getNativeCoefficients(frame, blocks) < -zeroTolerance
+    blocks = getPermutedBlocks(secretKey, W*W)
+    return lambda frame: getCoefficientMap(frame)[blocks] < -zeroTolerance
+
+def warmUp():
+    # One time initialisation, see warmup.py:
+    storage.warmUp()
+    inline.warmUp()
 
 def lambda_handler(event, context):
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
     try:
 
-        body = json.loads(event['body'])
+        body, binaryImage = inline.parseRequest(event)
 
-        # Handle error cases:
-        if("embeddedImageFileName" not in body):
+        # Handle error cases, the image is either in the bucket or inline (as embeddedImageBase64 or the binary body):
+        isInlineInput = binaryImage is not None or "embeddedImageBase64" in body
+        if("embeddedImageFileName" not in body and not isInlineInput):
             return sendErrorResponse(400, "Missing: embeddedImageFileName field not provided")
+
+        outputMode = inline.getOutputMode(body, isInlineInput)
+        if(outputMode not in inline.outputModes):
+            return sendErrorResponse(400, "output must be one of s3, inline or auto")
+
+        encoding, errorMessage = encoders.getEncoding(body, lossless=False)
+        if(encoding is None):
+            return sendErrorResponse(400, errorMessage)
         
         if("secretKey" not in body):
             return sendErrorResponse(400, "Missing: secretKey field not provided")
@@ -117,27 +230,206 @@ def lambda_handler(event, context):
         if(len(body["secretKey"])==0):
             return sendErrorResponse(400, "Secret Key can't be empty")
 
-        embeddedImage = s3_to_cv2(body["embeddedImageFileName"])
+        mode = body.get("mode", "resized")
+        if(mode not in modes):
+            return sendErrorResponse(400, "mode must be either resized or native")
+
+        # A repeated request returns the watermark written for the first one:
+        parameters = {"H": H, "W": W, "N": N, "fact": fact, "DCT_ROW": DCT_ROW, "DCT_COL": DCT_COL, "zeroTolerance": zeroTolerance, "encoding": encoding, "mode": mode}
+        cacheEntry = None
+        if(not isInlineInput and outputMode == "s3"):
+            cacheEntry = resultcache.getCacheEntry("extract", [body["embeddedImageFileName"]], body["secretKey"], None, parameters)
+        response = resultcache.lookup(cacheEntry)
+        if(response is not None):
+            storage.finishRequest()
+            return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry, True)})
+
+        embeddedImage, = inline.getImages(body, binaryImage, [("embeddedImageFileName", "embeddedImageBase64")])
         secretKey = body["secretKey"]
         
-        extractedWaterMark = extractWaterMarkImage(embeddedImage, secretKey)
-        extractedWaterMarkUrl = cv2_to_s3Url(extractedWaterMark, '.jpg', body["embeddedImageFileName"])
-
-        return {
-            "statusCode": 200,
-            'headers': {
-                'Access-Control-Allow-Headers' : 'Content-Type',
-                'Access-Control-Allow-Origin' : '*',
-                'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
-                'Content-Type': 'application/json'
-            },
-            "body": json.dumps(
-                {
-                    "message": "success",
-                    "extractedWaterMarkUrl": extractedWaterMarkUrl
-                }
-            ),
+        if(mode == "native"):
+            extractedWaterMark = extractWaterMarkNative(embeddedImage, secretKey)
+        else:
+            extractedWaterMark = extractWaterMarkImage(embeddedImage, secretKey)
+        if(extractedWaterMark is None):
+            storage.finishRequest()
+            return sendErrorResponse(400, f"The native mode needs an image of at least {N*W}x{N*W} pixels")
+        response = {"message": "success"}
+        responseFileName = inline.putImage(response, "extractedWaterMark", extractedWaterMark, encoding, body.get("embeddedImageFileName"), outputMode)
+        resultcache.store(cacheEntry, response, [responseFileName])
+        storage.finishRequest()
+        return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry)})
+
+    except Exception as e:
+        storage.finishRequest(raiseErrors=False)
+        return sendErrorResponse(500, str(e))
+
+def batch_lambda_handler(event, context):
+    # {"items": [...], ...}, every item is a request to lambda_handler, see batch.py:
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
+    return batch.handleBatch(event, context, lambda_handler, sendSuccessResponse, sendErrorResponse)
+
+def verify_lambda_handler(event, context):
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
+    try:
+
+        body, binaryImage = inline.parseRequest(event)
+
+        # Handle error cases, the images are either in the bucket or inline:
+        isInlineInput = binaryImage is not None or "embeddedImageBase64" in body
+        if("embeddedImageFileName" not in body and not isInlineInput):
+            return sendErrorResponse(400, "Missing: embeddedImageFileName field not provided")
+
+        outputMode = inline.getOutputMode(body, isInlineInput)
+        if(outputMode not in inline.outputModes):
+            return sendErrorResponse(400, "output must be one of s3, inline or auto")
+
+        encoding, errorMessage = encoders.getEncoding(body, lossless=False)
+        if(encoding is None):
+            return sendErrorResponse(400, errorMessage)
+
+        if("secretKeys" not in body):
+            return sendErrorResponse(400, "Missing: secretKeys field not provided")
+
+        if(not isinstance(body["secretKeys"], list) or len(body["secretKeys"])==0):
+            return sendErrorResponse(400, "secretKeys must be a non empty list")
+
+        if(len(body["secretKeys"]) > maxNoOfKeys):
+            return sendErrorResponse(400, f"Number of secretKeys exceeds {maxNoOfKeys}")
+
+        if(any(not isinstance(secretKey, str) or len(secretKey)==0 for secretKey in body["secretKeys"])):
+            return sendErrorResponse(400, "Secret Key can't be empty")
+
+        mode = body.get("mode", "resized")
+        if(mode not in modes):
+            return sendErrorResponse(400, "mode must be either resized or native")
+
+        imageFields = [("embeddedImageFileName", "embeddedImageBase64")]
+        if("referenceWaterMarkFileName" in body or "referenceWaterMarkBase64" in body):
+            imageFields.append(("referenceWaterMarkFileName", "referenceWaterMarkBase64"))
+        embeddedImage, *referenceWaterMark = inline.getImages(body, binaryImage, imageFields)
+        referenceWaterMark = referenceWaterMark[0] if referenceWaterMark else None
+
+        if(mode == "native" and min(embeddedImage.shape[:2]) < N*W):
+            storage.finishRequest()
+            return sendErrorResponse(400, f"The native mode needs an image of at least {N*W}x{N*W} pixels")
+        scores, bestIndex, bestWaterMark = verifyWaterMarkKeys(embeddedImage, body["secretKeys"], referenceWaterMark, mode)
+        response = {
+            "message": "success",
+            "scores": scores,
+            "bestKeyIndex": bestIndex
         }
 
+        # Optionally return the watermark extracted with the best matching key:
+        if(body.get("returnBestMatch", False)):
+            bestMatchFileName = None
+            if("embeddedImageFileName" in body):
+                bestMatchFileName = os.path.splitext(body["embeddedImageFileName"])[0] + "_bestMatch.jpg"
+            inline.putImage(response, "bestMatchWaterMark", bestWaterMark, encoding, bestMatchFileName, outputMode)
+        storage.finishRequest()
+        return sendSuccessResponse(response)
+
+    except Exception as e:
+        storage.finishRequest(raiseErrors=False)
+        return sendErrorResponse(500, str(e))
+
+def video_lambda_handler(event, context):
+    # Extracts the watermark of every frameStep-th frame of a video in the bucket, every bit of the returned watermark is
+    # the majority of the frames (which corrects the bits lost to the compression of single frames), see frames.py:
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
+    tempDir = None
+    try:
+        body = json.loads(event['body'])
+
+        # Handle error cases:
+        if("videoFileName" not in body):
+            return sendErrorResponse(400, "Missing: videoFileName field not provided")
+
+        outputMode = inline.getOutputMode(body, False)
+        if(outputMode not in inline.outputModes):
+            return sendErrorResponse(400, "output must be one of s3, inline or auto")
+
+        encoding, errorMessage = encoders.getEncoding(body, lossless=False)
+        if(encoding is None):
+            return sendErrorResponse(400, errorMessage)
+
+        if("secretKey" not in body):
+            return sendErrorResponse(400, "Missing: secretKey field not provided")
+
+        if(len(body["secretKey"])==0):
+            return sendErrorResponse(400, "Secret Key can't be empty")
+
+        mode = body.get("mode", "resized")
+        if(mode not in modes):
+            return sendErrorResponse(400, "mode must be either resized or native")
+
+        frameStep = body.get("frameStep", 1)
+        if(not isinstance(frameStep, int) or frameStep < 1):
+            return sendErrorResponse(400, "frameStep must be a positive integer")
+
+        videoFileName = body["videoFileName"]
+        tempDir = tempfile.mkdtemp()
+        inputPath = os.path.join(tempDir, "input" + os.path.splitext(videoFileName)[1])
+        storage.downloadFile(videoFileName, inputPath)
+        secretKey = body["secretKey"]
+
+        capture = frames.openVideo(inputPath)
+        if(capture is None):
+            storage.finishRequest()
+            return sendErrorResponse(400, "The video could not be decoded")
+        try:
+            info = frames.getVideoInfo(capture)
+            extractFrame = getFrameExtractor(mode, secretKey, (info["height"], info["width"], 3))
+            if(extractFrame is None):
+                storage.finishRequest()
+                return sendErrorResponse(400, f"The native mode needs a video of at least {N*W}x{N*W} pixels")
+
+            # Number of frames in which every bit is 1:
+            votes = np.zeros(W*W, dtype=np.int64)
+            def addVotes(bits):
+                votes[bits] += 1
+            start = time.perf_counter()
+            readState = {"truncated": False}
+            noOfFrames = frames.processFrames(frames.readFrames(capture, frameStep, readState), extractFrame, addVotes)
+            seconds = time.perf_counter() - start
+        finally:
+            capture.release()
+
+        if(readState["truncated"]):
+            storage.finishRequest()
+            return sendErrorResponse(400, f"The video can have at most {frames.maxFrames} frames")
+
+        if(noOfFrames == 0):
+            storage.finishRequest()
+            return sendErrorResponse(400, "The video has no frames")
+
+        # Ties go to 0, like a coefficient of 0 in a single image:
+        extractedWaterMark = np.where(2 * votes > noOfFrames, 255, 0).astype(np.uint8).reshape((W, W))
+        # Fraction of the bits of the frames that agree with the majority:
+        frameAgreement = np.maximum(votes, noOfFrames - votes).sum() / (noOfFrames * W * W)
+        response = {
+            "message": "success",
+            "noOfFrames": noOfFrames,
+            "frameAgreement": round(float(frameAgreement), 4),
+            "framesPerSecond": round(noOfFrames / seconds, 2)
+        }
+        inline.putImage(response, "extractedWaterMark", extractedWaterMark, encoding, videoFileName, outputMode)
+        storage.finishRequest()
+        return sendSuccessResponse(response)
     except Exception as e:
-        return sendErrorResponse(500, str(e))
\ No newline at end of file
+        storage.finishRequest(raiseErrors=False)
+        return sendErrorResponse(500, str(e))
+    finally:
+        # /tmp is kept between the invocations of a warm container:
+        if(tempDir is not None):
+            shutil.rmtree(tempDir, ignore_errors=True)
+
+# With provisioned concurrency the init phase runs ahead of the requests:
+if(warmup.warmUpOnInit):
+    warmUp()
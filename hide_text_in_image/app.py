@@ -1,15 +1,28 @@
-import os
-import boto3
 import json
 import numpy as np
-import cv2
-import copy
 import base64
+import struct
+import zlib
+import storage
+import resultcache
+import inline
+import warmup
+import batch
+import keyschedule
+import encoders
 
 delimiter = "##EE##"
 maxNoOfAllowedChars = 2048
-s3 = boto3.resource('s3')
-bucket_name = "forensic-tools-s3-bucket"
+chunkSize = 1 << 20     # Number of samples written to the image in one vectorised step
+maxBitsPerSample = 4    # Maximum number of least significant bits of a sample used by the framed format
+
+# Framed format: a fixed size header at the start of the permuted stream followed by exactly `length` bytes of payload
+headerMagic = b"\x89FWS"
+headerVersion = 1
+headerFormat = ">4sBBBxII"      # magic, version, payloadType, bitsPerSample, padding, length, crc32 of the payload
+headerSize = struct.calcsize(headerFormat)
+textPayload = 0
+binaryPayload = 1
 
 def sendErrorResponse(statusCode, errMessage):
     return {
@@ -27,129 +40,205 @@ def sendErrorResponse(statusCode, errMessage):
         ),
     }
 
+def sendSuccessResponse(body):
+    return {
+        "statusCode": 200,
+        'headers': {
+            'Access-Control-Allow-Headers' : 'Content-Type',
+            'Access-Control-Allow-Origin' : '*',
+            'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
+            'Content-Type': 'application/json'
+        },
+        "body": json.dumps(body),
+    }
 
-def convertASCIIStringToBinaryString(message):
-    result = ""
-    for ch in message:
-        result += "{0:08b}".format(ord(ch))
-    return result
-
-# This idea is motivated by RC4 algorithm to generate randomised permuted array from secret key
-def getPermutedArray(secretKey, n):
-    S = [i for i in range(n)] 
-    T = [0 for i in range(n)]
-    for i in range(n):
-        T[i] += ord(secretKey[i%len(secretKey)])
-        T[i] %= n
-    j = 0
-    for i in range(n):
-        j = (j + S[i] + T[i])%n
-        # swapping S[i] & S[j]
-        temp = S[i]
-        S[i] = S[j]
-        S[j] = temp
-    return S
+def isByteString(message):
+    # Code points above 255 don't fit in the 8 bits of a character, they would shift the delimiter off the byte boundaries:
+    try:
+        message.encode("latin-1")
+        return True
+    except UnicodeEncodeError:
+        return False
+
+def convertASCIIStringToBits(message):
+    # Every character is written as its 8 bit code, most significant bit first (see isByteString):
+    messageBytes = np.frombuffer(message.encode("latin-1"), dtype=np.uint8)
+    return np.unpackbits(messageBytes)
+
+def getPSNR(sumOfSquaredDifference, noOfValues):
+    # Same as cv2.PSNR(srcImage, srcImageOriginal), computed only from the values that were changed:
+    mse = sumOfSquaredDifference / noOfValues
+    return 20 * np.log10(255 / (np.sqrt(mse) + np.finfo(np.float64).eps))
+
+def convertBitsToSampleValues(bits, bitsPerSample):
+    # Groups of bitsPerSample bits, most significant bit first, the last group is padded with zeros:
+    bits = np.concatenate((bits, np.zeros(-len(bits) % bitsPerSample, dtype=np.uint8))).reshape(-1, bitsPerSample)
+    values = np.zeros(len(bits), dtype=np.uint8)
+    for i in range(bitsPerSample):
+        values = (values << 1) | bits[:, i]
+    return values
+
+def writeSamplesToImage(values, bitsPerSample, schedule, srcImage, startSample):
+    # Writes every value to the bitsPerSample least significant bits of one sample, from startSample onwards in the stream.
+    # srcImage is C contiguous, so the flat view writes through to it:
+    flatImage = srcImage.reshape(-1)
+    mask = (1 << bitsPerSample) - 1
+    sumOfSquaredDifference = 0.0
+    noOfFlippedBits = 0
+
+    for start in range(0, len(values), chunkSize):
+        stop = min(start + chunkSize, len(values))
+        indices = keyschedule.getFlatIndices(schedule, startSample + start, startSample + stop)
+
+        # Replace the least significant bits of the selected pixels in place, keeping only the old values of the changed ones:
+        pixels = flatImage[indices]
+        newPixels = pixels ^ ((pixels ^ values[start:stop].astype(srcImage.dtype)) & mask)
+        changed = np.flatnonzero(pixels != newPixels)
+        flatImage[indices[changed]] = newPixels[changed]
+
+        difference = newPixels[changed].astype(np.float64) - pixels[changed]
+        sumOfSquaredDifference += np.dot(difference, difference)
+        noOfFlippedBits += int(np.unpackbits((pixels[changed] ^ newPixels[changed]).astype(np.uint8)).sum())
+
+    return sumOfSquaredDifference, noOfFlippedBits
+
+def getStats(sumOfSquaredDifference, noOfFlippedBits, srcImage):
+    return {
+        "psnr": float(getPSNR(sumOfSquaredDifference, srcImage.size)),
+        "noOfFlippedBits": int(noOfFlippedBits)
+    }
 
 def hideDataToImage(message, secretKey, srcImage):
 
     # The imread unchanged is necessary to prevent converting single channel to three channel data (by duplication of same value into BGR layers)
-    srcImageOriginal = copy.deepcopy(srcImage) # For PSNR calculation later on
     message += delimiter
-    binaryMessage = convertASCIIStringToBinaryString(message)
-
-    # Process based on whether the image is three channel (RGB) or single channel (grayscale):
-    if(srcImage.ndim==2):
-        if(len(binaryMessage)>=srcImage.shape[0]*srcImage.shape[1]):
-            print("The message can't be econded as its length is too high")
-            return
-        x = getPermutedArray(secretKey, srcImage.shape[0])
-        y = getPermutedArray(secretKey, srcImage.shape[1])
-        count = 0
-        for i in x:
-            for j in y:
-                if(count==len(binaryMessage)):
-                    break
-                if(binaryMessage[count]=='0'):
-                    if(srcImage[i][j]%2==1):
-                        srcImage[i][j] -= 1
-                else:
-                    if(srcImage[i][j]%2==0):
-                        srcImage[i][j] += 1
-
-                count = count + 1
-    else:
-        if(len(binaryMessage)>=srcImage.shape[0]*srcImage.shape[1]*srcImage.shape[2]):
-            print("The message can't be econded as its length is too high")
-            return
-        x = getPermutedArray(secretKey, srcImage.shape[0])
-        y = getPermutedArray(secretKey, srcImage.shape[1])
-        z = getPermutedArray(secretKey, srcImage.shape[2])
-        count = 0   
-        for i in x:
-            for j in y:
-                for k in z:
-                    if(count==len(binaryMessage)):
-                        break
-                    if(binaryMessage[count]=='0'):
-                        if(srcImage[i][j][k]%2==1):
-                            srcImage[i][j][k] -= 1
-                    else:
-                        if(srcImage[i][j][k]%2==0):
-                            srcImage[i][j][k] += 1
-
-                    count = count + 1  
-    
-    print("The data is stored successfully with a psnr of ", cv2.PSNR(srcImage, srcImageOriginal))
-    return srcImage
-
+    binaryMessage = convertASCIIStringToBits(message)
+
+    # Works for both three channel (RGB) and single channel (grayscale) images:
+    if(len(binaryMessage)>=srcImage.size):
+        return None, None
+    srcImage = np.ascontiguousarray(srcImage)
+    schedule = keyschedule.getImageSchedule(secretKey, srcImage.shape)
+    sumOfSquaredDifference, noOfFlippedBits = writeSamplesToImage(binaryMessage, 1, schedule, srcImage, 0)
+    return srcImage, getStats(sumOfSquaredDifference, noOfFlippedBits, srcImage)
+
+def hideFramedDataToImage(payload, payloadType, secretKey, srcImage, bitsPerSample=1):
+    header = struct.pack(headerFormat, headerMagic, headerVersion, payloadType, bitsPerSample, len(payload), zlib.crc32(payload))
+
+    # Check the capacity up front, the header always takes 1 bit per sample & the payload bitsPerSample bits per sample:
+    noOfPayloadSamples = -(-8*len(payload) // bitsPerSample)
+    if(8*headerSize + noOfPayloadSamples > srcImage.size):
+        return None, None
+
+    srcImage = np.ascontiguousarray(srcImage)
+    schedule = keyschedule.getImageSchedule(secretKey, srcImage.shape)
+    headerBits = np.unpackbits(np.frombuffer(header, dtype=np.uint8))
+    payloadValues = convertBitsToSampleValues(np.unpackbits(np.frombuffer(payload, dtype=np.uint8)), bitsPerSample)
+    headerChange = writeSamplesToImage(headerBits, 1, schedule, srcImage, 0)
+    payloadChange = writeSamplesToImage(payloadValues, bitsPerSample, schedule, srcImage, 8*headerSize)
+    return srcImage, getStats(headerChange[0] + payloadChange[0], headerChange[1] + payloadChange[1], srcImage)
+
+
+def warmUp():
+    # One time initialisation, see warmup.py:
+    storage.warmUp()
+    inline.warmUp()
 
 def lambda_handler(event, context):
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
     try :
-        body = json.loads(event['body'])
+        body, binaryImage = inline.parseRequest(event, intFields=("bitsPerSample",))
+
+        # The delimiter format is the default, the framed format also takes binary data as messageBase64:
+        messageFormat = body.get("format", "delimiter")
+        if(messageFormat not in ("delimiter", "framed")):
+            return sendErrorResponse(400, "format must be either delimiter or framed")
 
         # Handle error cases:
-        if("message" not in body):
+        if("message" not in body and not (messageFormat == "framed" and "messageBase64" in body)):
             return sendErrorResponse(400, "Missing: message field not provided")
         
         if("secretKey" not in body):
             return sendErrorResponse(400, "Missing: secretKey field not provided")
 
-        if("fileName" not in body):
+        # The image is either in the bucket or inline, as imageBase64 or as the binary body:
+        inlineImage = inline.getInlineImage(body, binaryImage, "imageBase64")
+        if("fileName" not in body and inlineImage is None):
             return sendErrorResponse(400, "Missing: fileName field not provided")
+
+        outputMode = inline.getOutputMode(body, inlineImage is not None)
+        if(outputMode not in inline.outputModes):
+            return sendErrorResponse(400, "output must be one of s3, inline or auto")
+
+        encoding, errorMessage = encoders.getEncoding(body, lossless=True)
+        if(encoding is None):
+            return sendErrorResponse(400, errorMessage)
         
-        if(len(body["message"]) > maxNoOfAllowedChars):
+        if(messageFormat == "delimiter" and len(body["message"]) > maxNoOfAllowedChars):
             return sendErrorResponse(400, "Message length exceeds 2048 characters")
 
+        if(messageFormat == "delimiter" and not isByteString(body["message"])):
+            return sendErrorResponse(400, "The delimiter format only takes characters up to U+00FF, use the framed format for other text")
+
         if(len(body["secretKey"])==0):
             return sendErrorResponse(400, "Secret Key can't be empty")
 
+        # More bits per sample touch fewer pixels for the same payload, only the framed format records it:
+        bitsPerSample = body.get("bitsPerSample", 1)
+        if(not isinstance(bitsPerSample, int) or bitsPerSample < 1 or bitsPerSample > maxBitsPerSample):
+            return sendErrorResponse(400, f"bitsPerSample must be between 1 and {maxBitsPerSample}")
+
+        if(bitsPerSample != 1 and messageFormat != "framed"):
+            return sendErrorResponse(400, "bitsPerSample other than 1 needs the framed format")
+
+        # A repeated request returns the image written for the first one:
+        if(messageFormat == "framed" and "messageBase64" in body):
+            payload, payloadType = base64.b64decode(body["messageBase64"]), binaryPayload
+        elif(messageFormat == "framed"):
+            payload, payloadType = body["message"].encode("utf-8"), textPayload
+        else:
+            payload, payloadType = body["message"], None
+        parameters = {"format": messageFormat, "payloadType": payloadType, "bitsPerSample": bitsPerSample, "delimiter": delimiter, "headerVersion": headerVersion, "encoding": encoding}
+        cacheEntry = None
+        if(inlineImage is None and outputMode == "s3"):
+            cacheEntry = resultcache.getCacheEntry("hide", [body["fileName"]], body["secretKey"], payload, parameters)
+        response = resultcache.lookup(cacheEntry)
+        if(response is not None):
+            storage.finishRequest()
+            return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry, True)})
+
         # Get the object from the S3 bucket
-        object = s3.Object(bucket_name, body["fileName"])
-        image_content = object.get()['Body'].read()
-        nparr = np.frombuffer(image_content, np.uint8)
-        srcImage = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
+        image_content = inlineImage if inlineImage is not None else storage.getObject(body["fileName"])
+        srcImage = inline.decodeImage(image_content)
 
         # Get the response and store it to s3 bucket
-        responseImage = hideDataToImage(body["message"], body["secretKey"], srcImage)
-        responseImage = cv2.imencode('.png', responseImage)[1].tobytes()
-        responseFileName = os.path.splitext(body["fileName"])[0] + ".png"
-        s3.Bucket(bucket_name).put_object(Key=responseFileName, Body=responseImage)
-        responseUrl = f'https://{bucket_name}.s3.amazonaws.com/{responseFileName}'
-
-        return {
-            "statusCode": 200,
-            'headers': {
-                'Access-Control-Allow-Headers' : 'Content-Type',
-                'Access-Control-Allow-Origin' : '*',
-                'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
-                'Content-Type': 'application/json'
-            },
-            "body": json.dumps(
-                {
-                    "message": "success",
-                    "imageWithDataUrl": responseUrl
-                }
-            ),
-        }
+        if(messageFormat == "framed"):
+            responseImage, stats = hideFramedDataToImage(payload, payloadType, body["secretKey"], srcImage, bitsPerSample)
+        else:
+            responseImage, stats = hideDataToImage(body["message"], body["secretKey"], srcImage)
+        if(responseImage is None):
+            storage.finishRequest()
+            return sendErrorResponse(400, "The message can't be encoded as its length is too high for the image")
+        response = {"message": "success"}
+        responseFileName = inline.putImage(response, "imageWithData", responseImage, encoding, body.get("fileName"), outputMode)
+        response["psnr"] = stats["psnr"]
+        response["noOfFlippedBits"] = stats["noOfFlippedBits"]
+        resultcache.store(cacheEntry, response, [responseFileName])
+        storage.finishRequest()
+        return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry)})
     except Exception as e:
+        storage.finishRequest(raiseErrors=False)
         return sendErrorResponse(500, str(e))
+
+def batch_lambda_handler(event, context):
+    # {"items": [...], ...}, every item is a request to lambda_handler, see batch.py:
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
+    return batch.handleBatch(event, context, lambda_handler, sendSuccessResponse, sendErrorResponse)
+
+# With provisioned concurrency the init phase runs ahead of the requests:
+if(warmup.warmUpOnInit):
+    warmUp()
@@ -1,13 +1,28 @@
 import json
 import numpy as np
-import boto3
-import cv2
 import base64
+import struct
+import zlib
+import storage
+import resultcache
+import inline
+import warmup
+import batch
+import keyschedule
 
 delimiter = "##EE##"
 maxNoOfAllowedChars = 2048
-s3 = boto3.resource('s3')
-bucket_name = "forensic-tools-s3-bucket"
+chunkSize = 512         # Number of bytes read from the image in one vectorised step while looking for the delimiter
+maxGatherSize = 1 << 17 # Number of bytes of a framed payload read from the image in one vectorised step
+maxBitsPerSample = 4    # Maximum number of least significant bits of a sample used by the framed format
+
+# Framed format: a fixed size header at the start of the permuted stream followed by exactly `length` bytes of payload
+headerMagic = b"\x89FWS"
+headerVersion = 1
+headerFormat = ">4sBBBxII"      # magic, version, payloadType, bitsPerSample, padding, length, crc32 of the payload
+headerSize = struct.calcsize(headerFormat)
+textPayload = 0
+binaryPayload = 1
 
 def sendErrorResponse(statusCode, errMessage):
     return {
@@ -25,133 +40,158 @@ def sendErrorResponse(statusCode, errMessage):
         ),
     }
 
-def base64_to_cv2(base64_string):
-    img_data = base64.b64decode(base64_string)
-    img_array = np.frombuffer(img_data, dtype=np.uint8)
-    img = cv2.imdecode(img_array, cv2.IMREAD_UNCHANGED)
-    return img
-
-def convertASCIIStringToBinaryString(message):
-    result = ""
-    for ch in message:
-        result += "{0:08b}".format(ord(ch))
-    return result
-
-def convertBinaryStringToASCII(binaryString):
-    out = [binaryString[i:i+8] for i in range(0, len(binaryString), 8)]
-    asciiVal = [int(x, 2) for x in out]
-    result = ""
-    for x in asciiVal:
-        result += chr(x)
-    return result
-
-# This idea is motivated by RC4 algorithm to generate randomised permuted array from secret key
-def getPermutedArray(secretKey, n):
-    S = [i for i in range(n)] 
-    T = [0 for i in range(n)]
-    for i in range(n):
-        T[i] += ord(secretKey[i%len(secretKey)])
-        T[i] %= n
-    j = 0
-    for i in range(n):
-        j = (j + S[i] + T[i])%n
-        # swapping S[i] & S[j]
-        temp = S[i]
-        S[i] = S[j]
-        S[j] = temp
-    return S
+def sendSuccessResponse(body):
+    return {
+        "statusCode": 200,
+        'headers': {
+            'Access-Control-Allow-Headers' : 'Content-Type',
+            'Access-Control-Allow-Origin' : '*',
+            'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
+            'Content-Type': 'application/json'
+        },
+        "body": json.dumps(body),
+    }
+
+def convertBytesToASCII(data):
+    # Every byte is the code of one character:
+    return data.decode("latin-1")
+
+def readBytesFromImage(schedule, srcImage, start, stop):
+    # Bytes [start, stop) of the stream in one gather of the least significant bits:
+    indices = keyschedule.getFlatIndices(schedule, 8*start, 8*stop)
+    return np.packbits(srcImage.reshape(-1)[indices] & 1).tobytes()
+
+def readSamplesFromImage(schedule, srcImage, start, stop, bitsPerSample):
+    # The bitsPerSample least significant bits of the samples [start, stop) of the stream, most significant bit first:
+    indices = keyschedule.getFlatIndices(schedule, start, stop)
+    values = (srcImage.reshape(-1)[indices] & ((1 << bitsPerSample) - 1)).astype(np.uint8)
+    shifts = np.arange(bitsPerSample - 1, -1, -1, dtype=np.uint8)
+    return ((values.reshape(-1, 1) >> shifts) & 1).reshape(-1)
+
+def retrieveFramedDataFromImage(schedule, srcImage):
+    # Returns None when there is no framed header, so that the image is read in the delimiter format:
+    if(srcImage.size < 8*headerSize):
+        return None
+    header = readBytesFromImage(schedule, srcImage, 0, headerSize)
+    magic, version, payloadType, bitsPerSample, length, checksum = struct.unpack(headerFormat, header)
+    if(magic != headerMagic or version != headerVersion):
+        return None
+    if(payloadType not in (textPayload, binaryPayload) or bitsPerSample < 1 or bitsPerSample > maxBitsPerSample):
+        return True, ""
+
+    # The payload starts right after the header & takes bitsPerSample bits of every sample:
+    payloadStart = 8*headerSize
+    noOfPayloadSamples = -(-8*length // bitsPerSample)
+    if(payloadStart + noOfPayloadSamples > srcImage.size):
+        return True, ""
+
+    # Read exactly length bytes of payload, every step reads whole bytes as it covers a multiple of 8 samples:
+    samplesPerStep = 8*maxGatherSize
+    payload = bytearray()
+    for start in range(0, noOfPayloadSamples, samplesPerStep):
+        stop = min(start + samplesPerStep, noOfPayloadSamples)
+        bits = readSamplesFromImage(schedule, srcImage, payloadStart + start, payloadStart + stop, bitsPerSample)
+        payload += np.packbits(bits).tobytes()
+    payload = bytes(payload[:length])
+    if(zlib.crc32(payload) != checksum):
+        return True, ""
+    if(payloadType == binaryPayload):
+        return False, payload
+    return False, payload.decode("utf-8", errors="replace")
 
 def retrieveDataFromImage(secretKey, srcImage):
-    binaryMessage = ""
-    binaryDelimiter = convertASCIIStringToBinaryString(delimiter)
-    binaryDelimiterSize = len(binaryDelimiter)
-    shouldBreak = False
-    errorStatus = False
-    # Process based on whether the image is three channel (RGB) or single channel (grayscale):
-    if(srcImage.ndim==2):
-        x = getPermutedArray(secretKey, srcImage.shape[0])
-        y = getPermutedArray(secretKey, srcImage.shape[1])
-        for i in x:
-            for j in y:
-                if(srcImage[i][j]%2==0):
-                    binaryMessage += "0"
-                else:
-                    binaryMessage += "1"
-                if(len(binaryMessage)>=binaryDelimiterSize and binaryMessage[len(binaryMessage)-binaryDelimiterSize:]==binaryDelimiter):
-                    shouldBreak = True
-                    break
-                if(len(binaryMessage)-binaryDelimiterSize > maxNoOfAllowedChars*8):
-                    errorStatus = True
-                    shouldBreak = True
-                    break
-            if(shouldBreak):
-                break
-    else:
-        x = getPermutedArray(secretKey, srcImage.shape[0])
-        y = getPermutedArray(secretKey, srcImage.shape[1])
-        z = getPermutedArray(secretKey, srcImage.shape[2])
-        for i in x:
-            for j in y:
-                for k in z:
-                    if(srcImage[i][j][k]%2==0):
-                        binaryMessage += "0"
-                    else:
-                        binaryMessage += "1"
-                    if(len(binaryMessage)>=binaryDelimiterSize and binaryMessage[len(binaryMessage)-binaryDelimiterSize:]==binaryDelimiter):
-                        shouldBreak = True
-                        break 
-                    if(len(binaryMessage)-binaryDelimiterSize > maxNoOfAllowedChars*8):
-                        errorStatus = True
-                        shouldBreak = True
-                        break
-                if(shouldBreak):
-                    break
-            if(shouldBreak):
-                break
+    srcImage = np.ascontiguousarray(srcImage)
+    schedule = keyschedule.getImageSchedule(secretKey, srcImage.shape)
+    framedData = retrieveFramedDataFromImage(schedule, srcImage)
+    if(framedData is not None):
+        return framedData
+
+    delimiterBytes = delimiter.encode("latin-1")
+    # The image can hold at most maxNoOfAllowedChars characters followed by the delimiter:
+    maxNoOfBytes = min(maxNoOfAllowedChars + len(delimiterBytes), srcImage.size // 8)
+
+    # Read the least significant bits chunk by chunk till the delimiter shows up:
+    data = bytearray()
+    delimiterIndex = -1
+    while(len(data) < maxNoOfBytes):
+        start = len(data)
+        data += readBytesFromImage(schedule, srcImage, start, min(start + chunkSize, maxNoOfBytes))
+        # The delimiter may have started in the previous chunk:
+        delimiterIndex = data.find(delimiterBytes, max(0, start - len(delimiterBytes) + 1))
+        if(delimiterIndex != -1):
+            break
+
+    # Either the key is wrong or the message is too long:
+    if(delimiterIndex == -1):
+        return True, ""
+
     # Remove the delimiter:
-    binaryMessage = binaryMessage[:len(binaryMessage)-binaryDelimiterSize]
-    finalDecodeMessage = convertBinaryStringToASCII(binaryMessage)
-    return errorStatus, finalDecodeMessage
+    finalDecodeMessage = convertBytesToASCII(bytes(data[:delimiterIndex]))
+    return False, finalDecodeMessage
     
+def warmUp():
+    # One time initialisation, see warmup.py:
+    storage.warmUp()
+    inline.warmUp()
+
 def lambda_handler(event, context):
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
     try :
-        body = json.loads(event['body'])
+        body, binaryImage = inline.parseRequest(event)
 
         # Handle error cases:
         if("secretKey" not in body):
             return sendErrorResponse(400, "Missing: secretKey field not provided")
 
-        if("fileName" not in body):
+        # The image is either in the bucket or inline, as imageBase64 or as the binary body:
+        inlineImage = inline.getInlineImage(body, binaryImage, "imageBase64")
+        if("fileName" not in body and inlineImage is None):
             return sendErrorResponse(400, "Missing: fileName field not provided")
 
         if(len(body["secretKey"])==0):
             return sendErrorResponse(400, "Secret Key can't be empty")
 
+        # A repeated request returns the data retrieved for the first one, wrong keys aren't cached:
+        parameters = {"delimiter": delimiter, "maxNoOfAllowedChars": maxNoOfAllowedChars, "headerVersion": headerVersion}
+        cacheEntry = None
+        if(inlineImage is None):
+            cacheEntry = resultcache.getCacheEntry("retrieve", [body["fileName"]], body["secretKey"], None, parameters)
+        response = resultcache.lookup(cacheEntry)
+        if(response is not None):
+            storage.finishRequest()
+            return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry, True)})
+
         # Get the object from the S3 bucket
-        object = s3.Object(bucket_name, body["fileName"])
-        image_content = object.get()['Body'].read()
-        nparr = np.frombuffer(image_content, np.uint8)
-        srcImage = cv2.imdecode(nparr, cv2.IMREAD_UNCHANGED)
+        image_content = inlineImage if inlineImage is not None else storage.getObject(body["fileName"])
+        srcImage = inline.decodeImage(image_content)
 
         errorStatus, decodedMessage = retrieveDataFromImage(body["secretKey"], srcImage)
 
         if(errorStatus):
+            storage.finishRequest()
             return sendErrorResponse(400, "Either secretKey is wrong or message size exceeds 2048 characters")
 
-        return {
-            "statusCode": 200,
-            'headers': {
-                'Access-Control-Allow-Headers' : 'Content-Type',
-                'Access-Control-Allow-Origin' : '*',
-                'Access-Control-Allow-Methods' : 'POST,GET,OPTIONS',
-                'Content-Type': 'application/json'
-            },
-            "body": json.dumps(
-                {
-                    "message": "success",
-                    "retrievedData": decodedMessage
-                }
-            ),
-        }
+        # Binary payloads of the framed format are returned in base64:
+        if(isinstance(decodedMessage, bytes)):
+            response = {"message": "success", "retrievedDataBase64": base64.b64encode(decodedMessage).decode()}
+        else:
+            response = {"message": "success", "retrievedData": decodedMessage}
+        resultcache.store(cacheEntry, response)
+        storage.finishRequest()
+        return sendSuccessResponse({**response, "cache": resultcache.getStatus(cacheEntry)})
     except Exception as e:
+        storage.finishRequest(raiseErrors=False)
         return sendErrorResponse(500, str(e))
+
+def batch_lambda_handler(event, context):
+    # {"items": [...], ...}, every item is a request to lambda_handler, see batch.py:
+    if(warmup.isWarmUpEvent(event)):
+        warmUp()
+        return warmup.getWarmUpResponse()
+    return batch.handleBatch(event, context, lambda_handler, sendSuccessResponse, sendErrorResponse)
+
+# With provisioned concurrency the init phase runs ahead of the requests:
+if(warmup.warmUpOnInit):
+    warmUp()
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import concurrent.futures
+
+import storage
+
+# Batch requests: {"items": [{...}, ...], <fields shared by the items>} runs the handler of the function once per item,
+# several items at a time. cv2 & numpy release the GIL while decoding, encoding & computing, and the fetches of some items
+# overlap with the processing of others. Items that can't finish within the time left, or are still running at the
+# deadline, are returned as skipped.
+maxBatchSize = int(os.environ.get("BATCH_MAX_SIZE", 500))                   # Items of one request
+maxBatchWorkers = int(os.environ.get("BATCH_MAX_WORKERS", 4))               # Items processed at once
+timeBudgetMs = int(os.environ.get("BATCH_TIME_BUDGET_MS", 0))               # e.g. the 29s limit of API Gateway, 0 for the function timeout only
+deadlineMarginMs = int(os.environ.get("BATCH_DEADLINE_MARGIN_MS", 3000))    # Kept free to collect the results & respond
+itemEstimateMs = int(os.environ.get("BATCH_ITEM_ESTIMATE_MS", 2000))        # Time of an item until one has finished, e.g. a 12 MP image
+
+# Its own pool, the items wait on fetches & uploads run by the pool of storage:
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxBatchWorkers)
+
+def getDeadline(context, start):
+    # perf_counter time by which the response has to be ready, None when nothing limits it (e.g. run locally):
+    deadlines = []
+    if(context is not None and hasattr(context, "get_remaining_time_in_millis")):
+        deadlines.append(start + context.get_remaining_time_in_millis() / 1000)
+    if(timeBudgetMs > 0):
+        deadlines.append(start + timeBudgetMs / 1000)
+    if(not deadlines):
+        return None
+    return min(deadlines) - deadlineMarginMs / 1000
+
+def getItemEvent(sharedFields, item):
+    # Outputs go to the bucket, a response can't carry many images inline:
+    return {"body": json.dumps({**sharedFields, **item, "output": "s3"})}
+
+def runItem(handler, event):
+    start = time.perf_counter()
+    response = storage.runInRequest(handler, event, None)
+    return response, time.perf_counter() - start
+
+def getItemResult(index, response):
+    body = json.loads(response["body"])
+    if(response["statusCode"] == 200):
+        return {"index": index, "status": "success", "statusCode": 200, "result": body}
+    return {"index": index, "status": "error", "statusCode": response["statusCode"], "error": body.get("message")}
+
+def canStart(deadline, slowestItem, noOfRunning):
+    # Judging by the slowest item so far. Until an item has finished, the items started at once share the cpus, so the
+    # first ones only start while itemEstimateMs for each of them fits in the time left:
+    if(deadline is None):
+        return True
+    if(slowestItem is None):
+        return time.perf_counter() + (noOfRunning + 1) * itemEstimateMs / 1000 <= deadline
+    return time.perf_counter() + slowestItem <= deadline
+
+def processBatch(handler, sharedFields, items, deadline):
+    # Starts an item only when it is expected to finish before the deadline & stops waiting for the running ones at the
+    # deadline, their threads carry on but the response doesn't wait for them:
+    results = [None] * len(items)
+    slowestItem = None
+    running = {}
+    nextIndex = 0
+    while(nextIndex < len(items) or running):
+        while(nextIndex < len(items) and len(running) < maxBatchWorkers):
+            if(not canStart(deadline, slowestItem, len(running))):
+                break
+            running[executor.submit(runItem, handler, getItemEvent(sharedFields, items[nextIndex]))] = nextIndex
+            nextIndex += 1
+        if(not running):
+            break
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        done, _ = concurrent.futures.wait(running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+        if(not done):
+            break
+        for future in done:
+            index = running.pop(future)
+            try:
+                response, seconds = future.result()
+                slowestItem = max(slowestItem or 0.0, seconds)
+                results[index] = getItemResult(index, response)
+            except Exception as e:
+                results[index] = {"index": index, "status": "error", "statusCode": 500, "error": str(e)}
+
+    for index in running.values():
+        results[index] = {"index": index, "status": "skipped", "error": "Not finished: the time budget of the request ran out while it ran"}
+    for index in range(nextIndex, len(items)):
+        results[index] = {"index": index, "status": "skipped", "error": "Not processed: the time budget of the request ran out"}
+    return results
+
+def handleBatch(event, context, handler, sendSuccessResponse, sendErrorResponse):
+    start = time.perf_counter()
+    try:
+        body = json.loads(event['body'])
+
+        # Handle error cases:
+        if("items" not in body):
+            return sendErrorResponse(400, "Missing: items field not provided")
+
+        items = body["items"]
+        if(not isinstance(items, list) or len(items)==0):
+            return sendErrorResponse(400, "items must be a non empty list")
+
+        if(len(items) > maxBatchSize):
+            return sendErrorResponse(400, f"A batch can have at most {maxBatchSize} items")
+
+        if(any(not isinstance(item, dict) for item in items)):
+            return sendErrorResponse(400, "Every item must be an object")
+
+        sharedFields = {field: value for field, value in body.items() if field != "items"}
+        results = processBatch(handler, sharedFields, items, getDeadline(context, start))
+        noOfSkipped = sum(result["status"] == "skipped" for result in results)
+        return sendSuccessResponse({
+            "message": "success",
+            "results": results,
+            "noOfSucceeded": sum(result["status"] == "success" for result in results),
+            "noOfFailed": sum(result["status"] == "error" for result in results),
+            "noOfSkipped": noOfSkipped,
+            "complete": noOfSkipped == 0
+        })
+    except Exception as e:
+        return sendErrorResponse(500, str(e))
@@ -0,0 +1,76 @@
+import cv2
+
+# Encoders of the output images, chosen per request. Hidden messages live in the least significant bits, so those
+# outputs are written in a lossless format. Watermarks are spread over the dct coefficients of whole blocks and survive
+# a lossy one. The "encoding" field asks for the fastest or the smallest output, outputFormat, compressionLevel (png) &
+# quality (lossy formats) override the choice. Encode time against bytes is in benchmarks/bench_encoders.py.
+preferences = ("latency", "size")
+losslessFormats = ("png", "webp")
+lossyFormats = ("jpg", "webp")
+contentTypes = {"png": "image/png", "webp": "image/webp", "jpg": "image/jpeg"}
+sizePngCompression = 9      # zlib level of png for the size preference
+sizeJpegQuality = 85        # Less than half the bytes of the default 95, the watermark is still extracted with ~0.2% bit errors
+defaultWebPQuality = 90     # Lossy webp, above 100 cv2 writes lossless webp
+
+def getEncoding(body, lossless):
+    # (encoding, None) from the fields of the request, or (None, error message). The encoding is part of the
+    # description of a cached result, the encoder itself is only chosen once the image is known (see getEncoder):
+    preference = body.get("encoding", "latency")
+    if(preference not in preferences):
+        return None, "encoding must be either latency or size"
+
+    formats = losslessFormats if lossless else lossyFormats
+    outputFormat = body.get("outputFormat")
+    if(outputFormat is not None and outputFormat not in formats):
+        return None, f"outputFormat must be one of {', '.join(formats)}"
+
+    encoding = {"lossless": lossless, "preference": preference, "format": outputFormat}
+    if("compressionLevel" in body):
+        compressionLevel = body["compressionLevel"]
+        if(not lossless or outputFormat not in (None, "png")):
+            return None, "compressionLevel only applies to png outputs"
+        if(not isinstance(compressionLevel, int) or compressionLevel < 0 or compressionLevel > 9):
+            return None, "compressionLevel must be between 0 and 9"
+        encoding["compressionLevel"] = compressionLevel
+    if("quality" in body):
+        quality = body["quality"]
+        if(lossless):
+            return None, "quality only applies to lossy outputs, hidden messages need a lossless format"
+        if(not isinstance(quality, int) or quality < 1 or quality > 100):
+            return None, "quality must be between 1 and 100"
+        encoding["quality"] = quality
+    return encoding, None
+
+def isLosslessWebPImage(image):
+    # Lossless webp stores 8 bit colour images exactly. Grayscale would come back with three channels and transparent
+    # pixels may lose their colour, either would move the samples the message was hidden in:
+    return image.dtype == "uint8" and image.ndim == 3 and image.shape[2] == 3
+
+def getEncoder(encoding, image):
+    # {extension, cv2 parameters, content type} for the image:
+    preference = encoding["preference"]
+    outputFormat = encoding["format"]
+    if(outputFormat is None and encoding["lossless"]):
+        # A compression level asks for png:
+        outputFormat = "webp" if preference == "size" and "compressionLevel" not in encoding else "png"
+    elif(outputFormat is None):
+        outputFormat = "jpg"
+    if(outputFormat == "webp" and encoding["lossless"] and not isLosslessWebPImage(image)):
+        outputFormat = "png"
+
+    # Without parameters cv2 writes png tuned for speed (level 1, RLE) & jpg at quality 95:
+    params = []
+    if(outputFormat == "png"):
+        compressionLevel = encoding.get("compressionLevel", sizePngCompression if preference == "size" else None)
+        if(compressionLevel is not None):
+            params = [cv2.IMWRITE_PNG_COMPRESSION, compressionLevel]
+    elif(outputFormat == "webp"):
+        params = [cv2.IMWRITE_WEBP_QUALITY, 101 if encoding["lossless"] else encoding.get("quality", defaultWebPQuality)]
+    else:
+        quality = encoding.get("quality", sizeJpegQuality if preference == "size" else None)
+        if(quality is not None):
+            params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    return {"extension": "." + outputFormat, "params": params, "contentType": contentTypes[outputFormat]}
+
+def encode(image, encoder):
+    return cv2.imencode(encoder["extension"], image, encoder["params"])[1]
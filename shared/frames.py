@@ -0,0 +1,83 @@
+import os
+import collections
+import concurrent.futures
+import cv2
+
+# Videos, processed frame by frame from a local file: cv2.VideoCapture decodes one frame at a time, the frames are handed
+# to a pool of workers & their results are consumed in order (e.g. written by cv2.VideoWriter), so at most
+# maxFramesInFlight decoded frames are in memory whatever the length of the video. cv2 & numpy release the GIL while
+# decoding, transforming & encoding, so the decoder, the workers & the encoder overlap.
+maxWorkers = int(os.environ.get("VIDEO_MAX_WORKERS", 4))                                 # Frames processed at once
+maxFramesInFlight = int(os.environ.get("VIDEO_MAX_FRAMES_IN_FLIGHT", 2 * maxWorkers))   # Decoded frames waiting or being processed
+maxFrames = int(os.environ.get("VIDEO_MAX_FRAMES", 54000))                              # Frames of one video, 30 minutes at 30 fps
+
+# codec field: (fourcc, extension, content type). FFV1 is lossless, the others are lossy & smaller:
+codecs = {
+    "mp4v": ("mp4v", ".mp4", "video/mp4"),
+    "mjpg": ("MJPG", ".avi", "video/x-msvideo"),
+    "ffv1": ("FFV1", ".mkv", "video/x-matroska"),
+}
+
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers)
+
+def openVideo(path):
+    # None when the file can't be decoded:
+    capture = cv2.VideoCapture(path)
+    if(not capture.isOpened()):
+        capture.release()
+        return None
+    return capture
+
+def getVideoInfo(capture):
+    # The frame count comes from the container & may be missing (0) or approximate, the frames read are what counts:
+    return {
+        "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": capture.get(cv2.CAP_PROP_FPS) or 25.0,
+        "noOfFrames": int(capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+    }
+
+def readFrames(capture, frameStep=1, state=None):
+    # Every frameStep-th frame, the frames in between are only grabbed (demuxed, not converted to BGR). Stops after
+    # maxFrames frames, state["truncated"] then tells whether the video has more (the frame count of getVideoInfo can't
+    # be relied on for that):
+    index = 0
+    while(True):
+        if(index == maxFrames):
+            if(state is not None):
+                state["truncated"] = capture.grab()
+            return
+        if(index % frameStep == 0):
+            ok, frame = capture.read()
+            if(not ok):
+                return
+            yield frame
+        elif(not capture.grab()):
+            return
+        index += 1
+
+def openWriter(path, codec, fps, width, height):
+    # None when the codec isn't available in this build of cv2:
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codecs[codec][0]), fps, (width, height))
+    if(not writer.isOpened()):
+        writer.release()
+        return None
+    return writer
+
+def processFrames(frames, function, consume):
+    # consume(function(frame)) for every frame, in the order of the frames. Returns the number of frames:
+    inFlight = collections.deque()
+    noOfFrames = 0
+    try:
+        for frame in frames:
+            inFlight.append(executor.submit(function, frame))
+            if(len(inFlight) >= maxFramesInFlight):
+                consume(inFlight.popleft().result())
+            noOfFrames += 1
+        while(inFlight):
+            consume(inFlight.popleft().result())
+    finally:
+        # After an error the frames still queued are dropped:
+        for future in inFlight:
+            future.cancel()
+    return noOfFrames
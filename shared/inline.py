@@ -0,0 +1,104 @@
+import os
+import json
+import uuid
+import binascii
+import numpy as np
+import cv2
+
+import storage
+import encoders
+
+# Inline images: small images travel in the request & response instead of the bucket, which saves a GET & a PUT.
+# An image is given either as a base64 field of the JSON body or as the whole (binary) body, whose other fields are then
+# passed in the query string.
+maxInlineOutputBytes = int(os.environ.get("INLINE_OUTPUT_MAX_BYTES", 1 << 20))    # Largest output returned inline in the auto mode
+maxResponseBytes = 4 << 20      # Lambda responses are limited to 6 MB & base64 adds a third, larger outputs always go to the bucket
+outputModes = ("s3", "inline", "auto")
+inlinePrefix = "inline/"        # Outputs of inline inputs that go to the bucket anyway
+
+def parseRequest(event, intFields=()):
+    # (fields of the request, raw image of a binary body or None):
+    headers = {name.lower(): value for name, value in (event.get("headers") or {}).items()}
+    if(event.get("isBase64Encoded") and not headers.get("content-type", "").startswith("application/json")):
+        body = dict(event.get("queryStringParameters") or {})
+        # Query string values are strings, the numeric fields are converted back:
+        for field in intFields:
+            if(isinstance(body.get(field), str) and body[field].isdigit()):
+                body[field] = int(body[field])
+        return body, decodeBase64(event["body"])
+    return json.loads(event['body']), None
+
+def decodeBase64(data):
+    # binascii reads an ascii str in place, base64.b64decode would first copy it to bytes:
+    return binascii.a2b_base64(data)
+
+def encodeBase64(data):
+    return binascii.b2a_base64(data, newline=False).decode("ascii")
+
+def decodeImage(data):
+    # np.frombuffer wraps the decoded bytes without a copy, cv2.imdecode reads them directly:
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+
+def warmUp():
+    # The codecs initialise on their first use:
+    for format in ('.png', '.jpg', '.webp'):
+        decodeImage(cv2.imencode(format, np.zeros((8, 8, 3), np.uint8))[1])
+
+def getInlineImage(body, binaryImage, field):
+    # Raw bytes of an inline image: the binary body, else the base64 field, None when the image is in the bucket:
+    if(binaryImage is not None):
+        return binaryImage
+    if(field in body):
+        return decodeBase64(body[field])
+    return None
+
+def getOutputMode(body, isInlineInput):
+    # Results of images in the bucket go to the bucket unless asked otherwise, those of inline images are returned inline when small:
+    return body.get("output", "auto" if isInlineInput else "s3")
+
+def isInlineOutput(outputMode, noOfBytes):
+    if(noOfBytes > maxResponseBytes):
+        return False
+    return outputMode == "inline" or (outputMode == "auto" and noOfBytes <= maxInlineOutputBytes)
+
+def getOutputFileName(fileName, extension):
+    if(fileName is None):
+        return inlinePrefix + uuid.uuid4().hex + extension
+    return os.path.splitext(fileName)[0] + extension
+
+def getImages(body, binaryImage, fields):
+    # Decoded images for every (file name field, base64 field), the binary body stands for the first image.
+    # Inline images are decoded directly, the others are fetched & decoded concurrently:
+    images = [None] * len(fields)
+    bucketImages = []
+    for i, (fileNameField, base64Field) in enumerate(fields):
+        data = getInlineImage(body, binaryImage if i == 0 else None, base64Field)
+        if(data is not None):
+            images[i] = decodeImage(data)
+        else:
+            bucketImages.append((i, body[fileNameField]))
+    if(bucketImages):
+        for (i, _), image in zip(bucketImages, storage.getObjects([fileName for _, fileName in bucketImages], decodeImage)):
+            images[i] = image
+    return images
+
+def encodeImage(image, encoder):
+    return encoders.encode(image, encoder).tobytes()
+
+def putImage(response, field, image, encoding, fileName, outputMode):
+    # Adds the image to the response as <field>Base64, or uploads it & adds <field>Url. Returns the file name in the bucket or None.
+    # encoding comes from encoders.getEncoding, the extension of the file follows the format it picks for the image:
+    encoder = encoders.getEncoder(encoding, image)
+    if(outputMode == "s3"):
+        # Encoded & uploaded in the background, storage.finishRequest waits for it:
+        outputFileName = getOutputFileName(fileName, encoder["extension"])
+        response[field + "Url"] = storage.putObjectAsync(outputFileName, encodeImage, image, encoder, contentType=encoder["contentType"])
+        return outputFileName
+
+    data = encoders.encode(image, encoder)
+    if(isInlineOutput(outputMode, len(data))):
+        response[field + "Base64"] = encodeBase64(data)
+        return None
+    outputFileName = getOutputFileName(fileName, encoder["extension"])
+    response[field + "Url"] = storage.putObject(outputFileName, data.tobytes(), encoder["contentType"])
+    return outputFileName
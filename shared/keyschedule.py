@@ -0,0 +1,80 @@
+import os
+import hmac
+import hashlib
+import threading
+import collections
+import numpy as np
+
+# Permutations derived from the secret key, shared by the image handlers & copied next to app.py in every image.
+# The schedule is sequential (every swap depends on the ones before it), so it is computed once per key & size and kept
+# in the warm container. The cache is keyed by a hash of the secret keyed with a random key of the process, it never
+# holds the secrets themselves.
+cacheSize = int(os.environ.get("KEY_SCHEDULE_CACHE_SIZE", 256))     # Permutations & row indices kept in the container
+cacheHashKey = os.urandom(32)
+
+cacheLock = threading.Lock()
+cache = collections.OrderedDict()
+
+# This idea is motivated by RC4 algorithm to generate randomised permuted array from secret key
+def computePermutedArray(secretKey, n):
+    codes = [ord(character) for character in secretKey]
+    T = [codes[i % len(codes)] % n for i in range(n)]
+    S = list(range(n))
+    j = 0
+    for i in range(n):
+        j = (j + S[i] + T[i]) % n
+        # swapping S[i] & S[j]
+        S[i], S[j] = S[j], S[i]
+    return S
+
+def encodeSecretKey(secretKey):
+    # A key posted as JSON can hold lone surrogates, which strict utf-8 can't encode:
+    return secretKey.encode("utf-8", "surrogatepass")
+
+def getSecretHash(secretKey):
+    return hmac.new(cacheHashKey, encodeSecretKey(secretKey), hashlib.sha256).digest()
+
+def getCached(key, compute):
+    # Least recently used entries are evicted first, the values are read only arrays shared by concurrent requests:
+    with cacheLock:
+        value = cache.get(key)
+        if(value is not None):
+            cache.move_to_end(key)
+            return value
+    # Computed outside of the lock, two requests with the same new key may both compute it:
+    value = compute()
+    value.setflags(write=False)
+    with cacheLock:
+        cache[key] = value
+        while(len(cache) > cacheSize):
+            cache.popitem(last=False)
+    return value
+
+def getPermutation(secretKey, n):
+    return getCached(("permutation", getSecretHash(secretKey), n), lambda: np.array(computePermutedArray(secretKey, n), dtype=np.intp))
+
+def getPermutedArray(secretKey, n):
+    # As a list, the way the handlers used to compute it:
+    return getPermutation(secretKey, n).tolist()
+
+def getRowIndices(secretKey, shape):
+    # Flat offsets within one row (all the axes after the first) in the order of the nested loops "for j in y: for k in z",
+    # e.g. permutation_y[j]*z + permutation_z[k], expanded once per key & shape:
+    def compute():
+        indices = np.zeros(1, dtype=np.intp)
+        for dim in shape[1:]:
+            indices = (indices.reshape(-1, 1) * dim + getPermutation(secretKey, dim)).reshape(-1)
+        return indices
+    return getCached(("rows", getSecretHash(secretKey), tuple(shape)), compute)
+
+def getImageSchedule(secretKey, shape):
+    # What getFlatIndices needs for an image of this shape:
+    return getPermutation(secretKey, shape[0]), getRowIndices(secretKey, shape)
+
+def getFlatIndices(schedule, start, stop):
+    # Position p of the stream visits the pixels in the order of the nested loops "for i in x: for j in y: for k in z",
+    # as indices into the flattened image, so that a single index array gathers & scatters the samples:
+    rowPermutation, rowIndices = schedule
+    rowSize = len(rowIndices)
+    position = np.arange(start, stop)
+    return rowPermutation[position // rowSize] * rowSize + rowIndices[position % rowSize]
@@ -0,0 +1,85 @@
+import os
+import hmac
+import json
+import hashlib
+
+import storage
+import keyschedule
+
+# Results of the image operations keyed by their content: the ETags of the input objects, a keyed hash of the secret key,
+# the hash of the message & the parameters of the algorithm. A repeated request returns the stored response without
+# downloading or decoding anything. The manifests live in the bucket, so its lifecycle rule evicts them with the outputs.
+cacheHmacKey = os.environ.get("CACHE_HMAC_KEY", "")    # Caching is disabled without it, the secret keys are never hashed unkeyed
+cachePrefix = "result-cache/"
+cacheVersion = 1        # Bump to invalidate every manifest when the output of an algorithm changes
+
+def isEnabled():
+    return len(cacheHmacKey) > 0
+
+def getSecretHash(secretKey):
+    return hmac.new(cacheHmacKey.encode(), keyschedule.encodeSecretKey(secretKey), hashlib.sha256).hexdigest()
+
+def getKey(description):
+    # Keyed as well, so that nobody without the hmac key can derive the key of a manifest from a guessed secret:
+    return hmac.new(cacheHmacKey.encode(), json.dumps(description, sort_keys=True).encode(), hashlib.sha256).hexdigest()
+
+def getCacheEntry(operation, inputFileNames, secretKey, message=None, parameters=None):
+    # None when caching is disabled or an input doesn't exist (the operation then reports the error itself):
+    if(not isEnabled()):
+        return None
+    eTags = storage.headObjects(inputFileNames)
+    if(any(eTag is None for eTag in eTags)):
+        return None
+    if(isinstance(message, str)):
+        message = message.encode("utf-8")
+    description = {
+        "version": cacheVersion,
+        "operation": operation,
+        "inputs": eTags,
+        "secret": getSecretHash(secretKey),
+        "message": hashlib.sha256(message).hexdigest() if message is not None else None,
+        "parameters": parameters or {}
+    }
+    return {"key": getKey(description), "description": description, "inputFileNames": list(inputFileNames)}
+
+def lookup(cacheEntry):
+    # The stored response, when the manifest exists & every output is still the object that was written for it:
+    if(cacheEntry is None):
+        return None
+    try:
+        manifest = json.loads(storage.getObject(cachePrefix + cacheEntry["key"] + ".json"))
+    except Exception:
+        return None
+    outputs = manifest.get("outputs", {})
+    if(outputs and storage.headObjects(list(outputs)) != list(outputs.values())):
+        return None
+    return manifest["response"]
+
+def store(cacheEntry, response, outputFileNames=()):
+    # Called once the outputs are uploaded, their ETags detect an output overwritten or expired since:
+    if(cacheEntry is None):
+        return
+    storage.waitForUploads()
+    outputFileNames = list(outputFileNames)
+    eTags = storage.headObjects(outputFileNames) if outputFileNames else []
+    outputs = dict(zip(outputFileNames, eTags))
+    manifest = json.dumps({"response": response, "outputs": outputs}).encode()
+    storage.putObject(cachePrefix + cacheEntry["key"] + ".json", manifest, "application/json")
+
+    # An output written over its own input (e.g. host.jpg watermarked into host.jpg) changes the ETag of the input,
+    # the manifest is also stored under the key of the new ETag so that a resubmitted request still finds it:
+    inputETags = list(cacheEntry["description"]["inputs"])
+    for i, inputFileName in enumerate(cacheEntry["inputFileNames"]):
+        if(inputFileName in outputs):
+            inputETags[i] = outputs[inputFileName]
+    if(inputETags != cacheEntry["description"]["inputs"]):
+        aliasKey = getKey({**cacheEntry["description"], "inputs": inputETags})
+        storage.putObject(cachePrefix + aliasKey + ".json", manifest, "application/json")
+
+def getStatus(cacheEntry, hit=False):
+    # "bypass" for requests that aren't cached, e.g. with inline images:
+    if(not isEnabled()):
+        return "disabled"
+    if(cacheEntry is None):
+        return "bypass"
+    return "hit" if hit else "miss"
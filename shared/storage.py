@@ -0,0 +1,236 @@
+import os
+import json
+import hashlib
+import shutil
+import time
+import threading
+import contextvars
+import concurrent.futures
+
+# Storage shared by the handlers, copied next to app.py in every image.
+# The bucket is the default backend, LOCAL_STORAGE_DIR switches to a local directory so that a handler runs offline.
+bucket_name = os.environ.get("BUCKET_NAME", "forensic-tools-s3-bucket")
+localStorageDir = os.environ.get("LOCAL_STORAGE_DIR")
+maxPoolConnections = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 16))   # Connections kept open to S3 & threads doing I/O
+maxAttempts = int(os.environ.get("S3_MAX_ATTEMPTS", 5))                   # Attempts of a request, with backoff on throttling
+logStats = os.environ.get("STORAGE_STATS_LOG", "false").lower() == "true" # Print the operations of every request (& batch item)
+
+class S3Backend:
+    def __init__(self, bucketName):
+        # boto3 takes a few hundred milliseconds to import & set up, requests with inline images never need it:
+        import boto3
+        import botocore.config
+        self.bucketName = bucketName
+        config = botocore.config.Config(
+            max_pool_connections=maxPoolConnections,
+            retries={"max_attempts": maxAttempts, "mode": "standard"},
+            connect_timeout=5,
+            read_timeout=60,
+            tcp_keepalive=True
+        )
+        self.client = boto3.client('s3', config=config)
+
+    def get(self, key):
+        return self.client.get_object(Bucket=self.bucketName, Key=key)['Body'].read()
+
+    def put(self, key, data, contentType=None):
+        extraArgs = {"ContentType": contentType} if contentType else {}
+        self.client.put_object(Bucket=self.bucketName, Key=key, Body=data, **extraArgs)
+
+    def download(self, key, path):
+        # Large objects (e.g. videos) go straight to a file, in concurrent ranged parts:
+        self.client.download_file(self.bucketName, key, path)
+
+    def upload(self, path, key, contentType=None):
+        extraArgs = {"ContentType": contentType} if contentType else {}
+        self.client.upload_file(path, self.bucketName, key, ExtraArgs=extraArgs)
+
+    def head(self, key):
+        # ETag of the object without downloading it, None when it doesn't exist:
+        import botocore.exceptions
+        try:
+            return self.client.head_object(Bucket=self.bucketName, Key=key)['ETag'].strip('"')
+        except botocore.exceptions.ClientError as e:
+            if(e.response['Error']['Code'] in ("404", "NoSuchKey", "NotFound")):
+                return None
+            raise
+
+    def getUrl(self, key):
+        return f'https://{self.bucketName}.s3.amazonaws.com/{key}'
+
+class LocalBackend:
+    def __init__(self, rootDir):
+        self.rootDir = rootDir
+
+    def getPath(self, key):
+        # Keys are relative to the root directory, the same way as they are relative to the bucket:
+        path = os.path.abspath(os.path.join(self.rootDir, key))
+        if(os.path.commonpath([path, os.path.abspath(self.rootDir)]) != os.path.abspath(self.rootDir)):
+            raise ValueError(f"Key outside of the storage directory: {key}")
+        return path
+
+    def get(self, key):
+        with open(self.getPath(key), "rb") as file:
+            return file.read()
+
+    def put(self, key, data, contentType=None):
+        path = self.getPath(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+    def download(self, key, path):
+        shutil.copyfile(self.getPath(key), path)
+
+    def upload(self, path, key, contentType=None):
+        destination = self.getPath(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(path, destination)
+
+    def head(self, key):
+        # A directory has no ETags, the content hash plays that role:
+        path = self.getPath(key)
+        if(not os.path.exists(path)):
+            return None
+        with open(path, "rb") as file:
+            return hashlib.md5(file.read()).hexdigest()
+
+    def getUrl(self, key):
+        return "file://" + self.getPath(key)
+
+backend = None
+backendLock = threading.Lock()
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxPoolConnections)
+
+class Request:
+    # Latency & size of the operations of a request & its uploads still running, reported by finishRequest:
+    def __init__(self):
+        self.operations = []
+        self.pendingUploads = []
+
+statsLock = threading.Lock()
+defaultRequest = Request()
+# Set while the items of a batch run concurrently, so that every item waits for & reports only its own operations.
+# The executor threads run in a copy of the context of the caller, see submit:
+currentRequest = contextvars.ContextVar("currentRequest", default=None)
+
+def getBackend():
+    # Created on first use, or by warmUp:
+    global backend
+    with backendLock:
+        if(backend is None):
+            backend = LocalBackend(localStorageDir) if localStorageDir else S3Backend(bucket_name)
+    return backend
+
+def warmUp():
+    getBackend()
+
+def getRequest():
+    return currentRequest.get() or defaultRequest
+
+def runInRequest(function, *args):
+    # Runs function with its own operations & uploads, in the calling thread:
+    token = currentRequest.set(Request())
+    try:
+        return function(*args)
+    finally:
+        currentRequest.reset(token)
+
+def submit(function, *args):
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+def recordOperation(operation, key, noOfBytes, start):
+    with statsLock:
+        getRequest().operations.append({"operation": operation, "key": key, "bytes": noOfBytes, "seconds": round(time.perf_counter() - start, 6)})
+
+def getObject(key):
+    start = time.perf_counter()
+    data = getBackend().get(key)
+    recordOperation("get", key, len(data), start)
+    return data
+
+def putObject(key, data, contentType=None):
+    start = time.perf_counter()
+    getBackend().put(key, data, contentType)
+    recordOperation("put", key, len(data), start)
+    return getBackend().getUrl(key)
+
+def downloadFile(key, path):
+    start = time.perf_counter()
+    getBackend().download(key, path)
+    recordOperation("download", key, os.path.getsize(path), start)
+
+def uploadFile(path, key, contentType=None):
+    start = time.perf_counter()
+    getBackend().upload(path, key, contentType)
+    recordOperation("upload", key, os.path.getsize(path), start)
+    return getBackend().getUrl(key)
+
+def headObject(key):
+    start = time.perf_counter()
+    eTag = getBackend().head(key)
+    recordOperation("head", key, 0, start)
+    return eTag
+
+def headObjects(keys):
+    if(len(keys) == 1):
+        return [headObject(keys[0])]
+    return [future.result() for future in [submit(headObject, key) for key in keys]]
+
+def getObjects(keys, transform=None):
+    # Fetches the keys concurrently (and applies transform, e.g. decoding, in the same thread), results in the order of the keys:
+    def fetch(key):
+        data = getObject(key)
+        return transform(data) if transform else data
+    if(len(keys) == 1):
+        return [fetch(keys[0])]
+    return [future.result() for future in [submit(fetch, key) for key in keys]]
+
+def putObjectAsync(key, encode, *args, contentType=None):
+    # Encodes & uploads in the background, so that the handler carries on with the next output, returns the url right away.
+    # Lambda freezes the container once the handler returns, so the handler calls finishRequest before returning:
+    def upload():
+        return putObject(key, encode(*args), contentType)
+    with statsLock:
+        getRequest().pendingUploads.append(submit(upload))
+    return getBackend().getUrl(key)
+
+def getUrl(key):
+    return getBackend().getUrl(key)
+
+def waitForUploads(raiseErrors=True):
+    request = getRequest()
+    with statsLock:
+        uploads = list(request.pendingUploads)
+        request.pendingUploads.clear()
+    errors = []
+    for upload in uploads:
+        try:
+            upload.result()
+        except Exception as e:
+            errors.append(e)
+    if(errors and raiseErrors):
+        raise errors[0]
+
+def finishRequest(raiseErrors=True):
+    # Waits for the pending uploads, logs the operations of the request (with STORAGE_STATS_LOG) & returns their totals:
+    try:
+        waitForUploads(raiseErrors)
+    finally:
+        stats = logOperations()
+    return stats
+
+def logOperations():
+    request = getRequest()
+    with statsLock:
+        requestOperations = list(request.operations)
+        request.operations.clear()
+    stats = {}
+    for operation in requestOperations:
+        total = stats.setdefault(operation["operation"], {"count": 0, "bytes": 0, "seconds": 0.0})
+        total["count"] += 1
+        total["bytes"] += operation["bytes"]
+        total["seconds"] = round(total["seconds"] + operation["seconds"], 6)
+    if(logStats):
+        print(json.dumps({"storageOperations": requestOperations, "storageStats": stats}))
+    return stats
@@ -0,0 +1,16 @@
+import os
+import json
+
+# Expensive one time initialisation (S3 client, image codecs, corpora) is done by the warmUp function of every handler:
+# at init when WARM_UP_ON_INIT is set (e.g. with provisioned concurrency), on a warm-up event, or else on first use.
+warmUpOnInit = os.environ.get("WARM_UP_ON_INIT", "false").lower() == "true"
+
+def isWarmUpEvent(event):
+    # {"warmUp": true} sent directly or by a scheduled rule, which also sets source to aws.events:
+    return isinstance(event, dict) and (event.get("warmUp") is True or event.get("source") == "aws.events")
+
+def getWarmUpResponse():
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"message": "warm"}),
+    }